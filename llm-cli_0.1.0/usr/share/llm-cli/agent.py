@@ -1,20 +1,53 @@
 import random
 import json
-import base64
 import os
-import time
+from errors import APIError
+from streaming import StreamAccumulator
+from tool_dispatcher import ToolDispatcher
+from context_window import ContextWindow
+from attachments import AttachmentStore, part_key
+import instrumentation
 class Agent:
-    def __init__(self, api_handler: object, functions_handler: object = None, system_message: str = "", agent_identifier: str = f"AgentID:{random.randrange(0, 1000000)}"):
+    def __init__(self, api_handler: object, functions_handler: object = None, system_message: str = "", agent_identifier: str = f"AgentID:{random.randrange(0, 1000000)}", tool_dispatcher: ToolDispatcher = None, context_window: ContextWindow = None, attachment_store: AttachmentStore = None, audio_settings: dict = None):
         self.agent_identifier = agent_identifier
         self.api_handler = api_handler
         self.system_message = system_message
         self.messages = [{"role": "system", "content": self.system_message}]
         self.functions = functions_handler
+        self.tool_dispatcher = tool_dispatcher or (ToolDispatcher(functions_handler) if functions_handler else None)
 
         self.tool_recursions = {"current": 0, "max": 20}  # Added max recursions
-        self.audio_player = AudioPlayback()
+        # Trims what is sent (not self.messages) to the token budget; context_report describes the last request
+        self.context_window = context_window or ContextWindow()
+        self.context_report = None
+        # Images and audio are encoded once per content hash; attachment_refs tracks where they sit in the history
+        self.attachments = attachment_store or AttachmentStore()
+        self.attachment_refs = []
+        self.user_turns = 0
         self.modality = 'text'
-        
+        self._audio_player = None
+        self.audio_settings = audio_settings or {}
+        # Optional SessionLog the history is appended to as it grows (llm --session)
+        self.session = None
+        # Tool call traces are printed unless redirected with set_output (the daemon sends them to the client)
+        self.output = print
+
+    @property
+    def audio_player(self):
+        # Only voice sessions need an audio device, so it is created on first use
+        if self._audio_player is None:
+            import atexit
+            from audio import AudioPlayback
+            self._audio_player = AudioPlayback(**self.audio_settings)
+            # Answers play in the background; let the last one finish before the process exits
+            atexit.register(self._audio_player.wait)
+        return self._audio_player
+
+    def set_output(self, write):
+        """Sends tool call traces, and what the tools themselves report, to `write(text)`."""
+        self.output = write
+        if self.functions:
+            self.functions.output = write
 
     def get_identifier(self): 
         return self.agent_identifier
@@ -22,95 +55,146 @@ class Agent:
     def clear_messages(self): 
         self.messages = [{"role": "system", "content": self.system_message}]
         self.modality = 'text'
+        self.attachment_refs = []
+        if self.session:
+            self.session.reset(self.messages)
 
-    def chat(self, input_data: list=None):
-        
+    def attach_session(self, session):
+        """Saves the history to `session` from now on, resuming the turns it already holds that fit the context."""
+        self.session = session
+        history = session.load(self.context_window.max_prompt_tokens)
+        if history:
+            self.messages = history
+            self.attachment_refs = []
+            self.user_turns = 0
+            # Resumed images/audio become placeholders on the same schedule as new ones
+            for message in history:
+                # Counted like _chat counts them: user input arrives as a content list
+                if message.get('role') == 'user' and isinstance(message.get('content'), list):
+                    self.user_turns += 1
+                    self._register_attachments(message)
+            self._retire_stale_attachments()
+        else:
+            session.sync(self.messages)
+
+    def _persist(self):
+        if self.session:
+            self.session.sync(self.messages)
+
+    def chat(self, input_data: list=None, on_token=None):
+        """
+        Sends the conversation to the model and returns the final answer.
+        If `on_token` is given the response is streamed and `on_token(text)` is called for every content delta.
+        """
+        profiler = instrumentation.get_profiler()
+        if profiler is None or not input_data:
+            return self._chat(input_data, on_token)
+        # One profiled turn covers every request/tool round until the final answer
+        with profiler.turn():
+            return self._chat(input_data, on_token)
+
+    def _chat(self, input_data: list=None, on_token=None):
         # print(input_data)  # For debugging
         if input_data:
             self.messages.append({"role": "user", "content": input_data})
+            self._track_attachments(self.messages[-1])
+            self._persist()
 
-        self.model_parameters = {'model': 'o3-mini', 'messages': self.messages, "max_completion_tokens": 8096}
+        messages, self.context_report = self.context_window.fit(self.messages)
+        self.model_parameters = {'model': 'o3-mini', 'messages': messages, "max_completion_tokens": 8096}
         
         
         if input_data and any([item['type'] == 'input_audio' for item in input_data]) or self.modality == 'audio':
             print("Audio input detected")
             self.modality = 'audio' 
             self.model_parameters['model'] = "gpt-4o-audio-preview"
-            self.model_parameters['audio'] = {'voice': 'alloy', 'format': 'wav'}
-            self.model_parameters['modalities'] = ['text']
+            # pcm16 is the format that can be streamed and played as it arrives
+            self.model_parameters['audio'] = {'voice': 'alloy', 'format': 'pcm16'}
+            self.model_parameters['modalities'] = ['text', 'audio']
         
         
         if self.functions: 
-            self.model_parameters['tools'] = self.functions.get_tools()
+            self.model_parameters['tools'] = self.functions.get_tools(self.messages)
             self.model_parameters['tool_choice'] = 'auto'
 
 
-        model_response = self.api_handler.send_request(self.model_parameters)
-
-        #print(model_response)
-
-        if not model_response or "error" in model_response:
-            time.sleep(1)
-            model_response = self.api_handler.send_request(self.model_parameters)
+        try:
+            # Retries and backoff happen inside the api handler
+            model_response = self._request(on_token)
+        except APIError as e:
+            self.tool_recursions['current'] = 0
+            return f"Request failed: {e}"
 
         if model_response and 'choices' in model_response and model_response['choices'][0]['message']:
             response_message = model_response['choices'][0]['message']
 
     
-            if 'audio' in model_response:
-                audio_data = model_response['audio']['data']
-                self.audio_player.play_audio(audio_data)
+            # The transcript stands in for the audio in the history; the audio id expires, so it is not kept
+            audio = response_message.pop('audio', None)
+            if audio:
+                if audio.get('data'):
+                    self.audio_player.play_audio(audio['data'])
+                if not response_message.get('content'):
+                    response_message['content'] = audio.get('transcript')
             
             self.messages.append(response_message)
+            self._persist()
 
             if 'tool_calls' in response_message:
                 if self.tool_recursions['current'] < self.tool_recursions['max']:
                     self.tool_recursions['current'] += 1
-                    for tool_call in response_message['tool_calls']:
+                    # Calls run concurrently, results come back in tool_call order
+                    for tool_call, function_arguments, tool_output in self.tool_dispatcher.run(response_message['tool_calls']):
                         function_name = tool_call['function']['name']
-                        function_arguments = json.loads(tool_call['function']['arguments'])
-
-                        tool_output = self.functions.run_tool(function_name, function_arguments)
-                        print(f"tool_call: {function_name} with inputs {str(function_arguments)}\ntool output: {tool_output}")
+                        self.output(f"tool_call: {function_name} with inputs {str(function_arguments)}\ntool output: {tool_output}")
                         self._add_message(content=json.dumps(tool_output), call_id=tool_call['id'])
-                    return self.chat()
+                        self._persist()
+                    return self._chat(on_token=on_token)
                 
                 self.tool_recursions['current'] = 0
                 message = response_message["content"]
                 self._add_message(content=message)
+                self._persist()
                 return message
             else:
                 self.tool_recursions['current'] = 0
                 message = response_message["content"]
                 self._add_message(content=message)
+                self._persist()
                 return message
         else:
             return "Response is of NoneType or invalid format"
 
+    def _request(self, on_token=None):
+        if on_token is None:
+            return self.api_handler.send_request(self.model_parameters)
+        return self._stream(on_token)
+
+    def _stream(self, on_token):
+        """Streams the completion, forwarding content deltas and reassembling tool calls."""
+        # Audio deltas go straight to the player, so a voice answer starts playing while it streams
+        on_audio = (lambda data: self.audio_player.feed(data)) if self.modality == 'audio' else None
+        accumulator = StreamAccumulator(on_audio=on_audio)
+        try:
+            for chunk in self.api_handler.stream_request(self.model_parameters):
+                text = accumulator.add(chunk)
+                if text:
+                    on_token(text)
+        finally:
+            # Playback drains in the background; the next answer waits for it in begin()
+            if self._audio_player is not None:
+                self._audio_player.finish(wait=False)
+        return accumulator.response()
+
     def _prepare_content(self, message: str, image_path: str = None, audio_data = None):
         content = [{"type": "text", "text": message}]
         if image_path:
-            base64_image = self._encode_image(image_path)
-            content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}})
+            content.append(self.attachments.add_image(image_path).content_part())
         if audio_data:
-            content.append({
-                "type": "input_audio",
-                "input_audio": {
-                    "data": self._encode_audio(audio_data.read()),
-                    "format": "wav"
-                }
-            })
+            content.append(self.attachments.add_audio(audio_data, "wav").content_part())
         
         return content
 
-    def _encode_image(self, image_path):
-        with open(image_path, "rb") as image_file:
-            encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
-            return encoded_image
-        
-    def _encode_audio(self, audio_bytes):
-        return base64.b64encode(audio_bytes).decode('utf-8')
-
     def _add_message(self, content, call_id: str = None, image=False, audio=False) -> None:
         """
         Adds a message to the chat history, automatically determining the role.
@@ -151,7 +235,43 @@ class Agent:
         self.messages.append(message)
         
 
+    def _track_attachments(self, message: dict):
+        """Registers the images and audio in a new user message and retires the ones that went stale."""
+        self.user_turns += 1
+        self._register_attachments(message)
+        self._retire_stale_attachments()
+
+    def _register_attachments(self, message: dict):
+        # Taken from the message itself: parts the store evicted or never saw (resumed sessions) are tracked too
+        if isinstance(message['content'], list):
+            for part in message['content']:
+                key = part_key(part)
+                if key:
+                    self.attachment_refs.append({"turn": self.user_turns, "message": message, "key": key,
+                                                 "attachment": self.attachments.find(key[1])})
+
+    def _retire_stale_attachments(self):
+        stale = [ref for ref in self.attachment_refs if self.user_turns - ref['turn'] >= self.attachments.stale_after_turns]
+        for ref in stale:
+            self._replace_attachment(ref, self.attachments.placeholder(*ref['key']))
+
+    def _replace_attachment(self, ref: dict, replacement: dict = None):
+        # A new content list (rather than an in-place edit) so cached sizes/encodings of the message are invalidated
+        content = []
+        for part in ref['message']['content']:
+            if part_key(part) == ref['key']:
+                if replacement:
+                    content.append(replacement)
+            else:
+                content.append(part)
+        ref['message']['content'] = content
+        self.attachment_refs.remove(ref)
+        if self.session:
+            position = next((i for i, message in enumerate(self.messages) if message is ref['message']), None)
+            if position is not None:
+                self.session.replace(position, ref['message'])
+
     def remove_image_from_messages(self, filename):
-        for message in self.messages:
-            if message['role'] == 'user' and isinstance(message['content'], list):
-                message['content'] = [item for item in message['content'] if not (item['type'] == 'image_url' and filename in item['image_url']['url'])]
+        name = os.path.basename(filename)
+        for ref in [ref for ref in self.attachment_refs if ref['attachment'] and ref['attachment'].filename == name]:
+            self._replace_attachment(ref)
@@ -1,27 +1,210 @@
-# Dependencies 
-import requests as rq
+# Dependencies
+import time
+from errors import APIError, RateLimitError, TransportError, error_for_status
+from rate_limiter import RetryPolicy, get_shared_rate_limiter, estimate_tokens, parse_retry_after
+from streaming import StreamAccumulator, iter_sse_data, aiter_sse_data, response_to_chunks
+from transport import get_shared_transport, AsyncTransport
+from instrumentation import span, record, usage_attrs
 
 # This program will handle the API calls used in the subsystem
 
-class APIHandler: 
-    def __init__(self, url: str, headers: dict): 
+class APIHandler:
+    def __init__(self, url: str, headers: dict, transport=None, retry_policy: RetryPolicy = None, rate_limiter=None, response_cache=None, router=None):
         self.url = url
-        self.headers = headers 
+        self.headers = headers
+        # Pooled keep-alive connections, shared with every other handler unless one is passed in
+        self.transport = transport or get_shared_transport()
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Request/token budget shared by every handler in the process
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter()
+        # Optional response_cache.ResponseCache, consulted before any request is sent
+        self.response_cache = response_cache
+        # Optional router.Router; when set, url/headers are ignored and every attempt goes to its healthiest backend
+        self.router = router
 
 
-    
-    def send_request(self, model_parameters: dict): 
 
-        # send post
-        response = rq.post(url=self.url, headers=self.headers, json=model_parameters)
-        print(response.json())
-        if response.status_code == 200: 
-            return response.json()
-        else:
-            return f"api send request error, this could indicate bad input or a server error. Status code: {response.status_code}"
-    
+    def send_request(self, model_parameters: dict):
+        """Returns the decoded completion, raises an errors.APIError subclass once retries are exhausted."""
+        with span("request", model=model_parameters.get('model'), stream=False) as request_span:
+            if self.response_cache:
+                cached = self.response_cache.get(model_parameters)
+                if cached is not None:
+                    request_span.set(cached=True)
+                    return cached
 
+            response, estimated = self._post(model_parameters, request_span=request_span)
+            data = response.json()
+            request_span.set(bytes_received=len(response.content), **usage_attrs(data.get('usage')))
+            self.rate_limiter.settle(estimated, (data.get('usage') or {}).get('total_tokens'))
+            if self.response_cache:
+                self.response_cache.put(model_parameters, data)
+            return data
 
-        
+    def stream_request(self, model_parameters: dict):
+        """
+        Sends the request with `stream: true` and yields every completion chunk as it arrives.
+        Use streaming.StreamAccumulator to rebuild the full message from the chunks.
+        """
+        with span("request", model=model_parameters.get('model'), stream=True) as request_span:
+            if self.response_cache:
+                cached = self.response_cache.get(model_parameters)
+                if cached is not None:
+                    request_span.set(cached=True)
+                    yield from response_to_chunks(cached)
+                    return
 
+            parameters = dict(model_parameters, stream=True)
+            parameters.setdefault('stream_options', {'include_usage': True})
 
+            response, estimated = self._post(parameters, stream=True, request_span=request_span)
+            accumulator = StreamAccumulator() if self.response_cache else None
+            used = None
+            try:
+                with response:
+                    try:
+                        for chunk in iter_sse_data(request_span.count_bytes(response.iter_lines())):
+                            request_span.mark("first_chunk")
+                            if chunk.get('usage'):
+                                used = chunk['usage'].get('total_tokens')
+                                request_span.set(**usage_attrs(chunk['usage']))
+                            if accumulator:
+                                accumulator.add(chunk)
+                            yield chunk
+                    except OSError as e:
+                        # requests' ChunkedEncodingError/ConnectionError/ReadTimeout all derive from OSError
+                        raise TransportError(f"stream interrupted: {e}") from e
+            finally:
+                # Also when the stream broke or the caller stopped reading, so the reservation is released
+                self.rate_limiter.settle(estimated, used)
+            if accumulator:
+                self.response_cache.put(model_parameters, accumulator.response())
+
+    def _post(self, model_parameters: dict, stream: bool = False, request_span=None):
+        """Posts through the rate limiter, retrying retryable failures. Returns (response, reserved tokens)."""
+        # Encoded once for all attempts; only messages not sent before are actually serialized
+        sizes = {}
+        body = self.transport.encode(model_parameters, sizes)
+        estimated = estimate_tokens(model_parameters, sizes.get('messages'))
+        attempt = 0
+        failed = set()  # backends that already failed this request, when routing
+        while True:
+            attempt_started = time.perf_counter()
+            self.rate_limiter.acquire(estimated)
+            try:
+                if self.router:
+                    response, backend = self.router.send(self.transport, model_parameters, stream, exclude=failed)
+                    if request_span:
+                        request_span.set(backend=backend.name)
+                else:
+                    response = self.transport.post(url=self.url, headers=self.headers, data=body, stream=stream)
+                    self.rate_limiter.update_from_headers(response.headers)
+                    if response.status_code != 200:
+                        error = error_for_status(response.status_code, response.text, parse_retry_after(response.headers))
+                        response.close()
+                        raise error
+                if request_span:
+                    request_span.set(bytes_sent=len(getattr(response.request, 'body', None) or body), attempts=attempt + 1)
+                return response, estimated
+            except RateLimitError as error:
+                self.rate_limiter.settle(estimated, 0)
+                if attempt >= self.retry_policy.max_retries:
+                    raise
+                if self.router:
+                    self._wait_for_backend(failed, attempt, error)
+                else:
+                    # Pause the whole process, not just this handler, so other agents back off too
+                    self.rate_limiter.pause(self.retry_policy.delay(attempt, error.retry_after))
+                record("retry", attempt_started, attempt=attempt + 1, status=error.status_code)
+            except APIError as error:
+                self.rate_limiter.settle(estimated, 0)
+                if not error.retryable or attempt >= self.retry_policy.max_retries:
+                    raise
+                if self.router:
+                    self._wait_for_backend(failed, attempt, error)
+                else:
+                    time.sleep(self.retry_policy.delay(attempt, error.retry_after))
+                record("retry", attempt_started, attempt=attempt + 1, status=error.status_code, error=type(error).__name__)
+            attempt += 1
+
+    def _wait_for_backend(self, failed: set, attempt: int, error: APIError):
+        # Fail over at once while another backend is healthy; back off only when none is left
+        if self.router.choose(exclude=failed) is not None:
+            return
+        time.sleep(self.retry_policy.delay(attempt, error.retry_after))
+        failed.clear()
+
+
+class AsyncAPIHandler:
+    """
+    asyncio-native variant of APIHandler. Pass the same AsyncTransport to several
+    handlers to let concurrent agents share one connection pool.
+    """
+
+    def __init__(self, url: str, headers: dict, transport: AsyncTransport = None, retry_policy: RetryPolicy = None, rate_limiter=None):
+        self.url = url
+        self.headers = headers
+        self.transport = transport or AsyncTransport()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter()
+
+    async def send_request(self, model_parameters: dict):
+        response, estimated = await self._post(model_parameters)
+        try:
+            data = await response.json()
+        finally:
+            response.release()
+        self.rate_limiter.settle(estimated, (data.get('usage') or {}).get('total_tokens'))
+        return data
+
+    async def stream_request(self, model_parameters: dict):
+        parameters = dict(model_parameters, stream=True)
+        parameters.setdefault('stream_options', {'include_usage': True})
+
+        import asyncio
+        response, estimated = await self._post(parameters)
+        used = None
+        try:
+            async for chunk in aiter_sse_data(response.content):
+                if chunk.get('usage'):
+                    used = chunk['usage'].get('total_tokens')
+                yield chunk
+        except (self.transport._aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise TransportError(f"stream interrupted: {e}") from e
+        finally:
+            response.release()
+            self.rate_limiter.settle(estimated, used)
+
+    async def _post(self, model_parameters: dict):
+        import asyncio
+        sizes = {}
+        body = self.transport.encode(model_parameters, sizes)
+        estimated = estimate_tokens(model_parameters, sizes.get('messages'))
+        attempt = 0
+        while True:
+            wait = self.rate_limiter.try_acquire(estimated)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self.rate_limiter.try_acquire(estimated)
+            try:
+                response = await self.transport.post(url=self.url, headers=self.headers, data=body)
+                self.rate_limiter.update_from_headers(response.headers)
+                if response.status == 200:
+                    return response, estimated
+                error = error_for_status(response.status, await response.text(), parse_retry_after(response.headers))
+                response.release()
+                raise error
+            except RateLimitError as error:
+                self.rate_limiter.settle(estimated, 0)
+                if attempt >= self.retry_policy.max_retries:
+                    raise
+                self.rate_limiter.pause(self.retry_policy.delay(attempt, error.retry_after))
+            except APIError as error:
+                self.rate_limiter.settle(estimated, 0)
+                if not error.retryable or attempt >= self.retry_policy.max_retries:
+                    raise
+                await asyncio.sleep(self.retry_policy.delay(attempt, error.retry_after))
+            attempt += 1
+
+    async def close(self):
+        await self.transport.close()
@@ -0,0 +1,137 @@
+import base64
+import hashlib
+import io
+import mimetypes
+import os
+from collections import OrderedDict
+
+# Content-addressed store for the images and audio attached to a conversation
+
+
+def part_key(part: dict):
+    """(kind, encoded data) of an image or audio content part, or None for anything else."""
+    if part.get('type') == 'image_url':
+        return "image", part['image_url']['url']
+    if part.get('type') == 'input_audio':
+        return "audio", part['input_audio']['data']
+    return None
+
+
+def placeholder_part(kind: str, name: str, digest: str) -> dict:
+    shown = "shown" if kind == "image" else "played"
+    return {"type": "text", "text": f"[{kind} {name} (sha256 {digest[:12]}) was {shown} earlier and removed from the history]"}
+
+
+class Attachment:
+    """One encoded image (`data` is a data URL) or audio clip (`data` is base64, `audio_format` e.g. "wav")."""
+
+    def __init__(self, digest: str, mime: str, data: str, filename: str, size: int, kind: str = "image", audio_format: str = None):
+        self.digest = digest
+        self.mime = mime
+        self.data = data
+        self.filename = filename
+        self.size = size
+        self.kind = kind
+        self.audio_format = audio_format
+
+    def content_part(self) -> dict:
+        if self.kind == "audio":
+            return {"type": "input_audio", "input_audio": {"data": self.data, "format": self.audio_format}}
+        return {"type": "image_url", "image_url": {"url": self.data}}
+
+    def placeholder_part(self) -> dict:
+        return placeholder_part(self.kind, self.filename, self.digest)
+
+
+class AttachmentStore:
+    """
+    Encodes every distinct image or audio clip once. Attachments are keyed by the sha256 of
+    the file contents, image files by (path, mtime, size) so an unchanged file is not even re-read.
+
+    Images larger than `max_dimension` pixels or `max_image_bytes` bytes are downscaled and
+    recompressed to JPEG when Pillow is installed. Attachments older than `stale_after_turns`
+    user turns are swapped for a short text placeholder by Agent.
+    """
+
+    def __init__(self, max_dimension: int = 2048, max_image_bytes: int = 4000000, jpeg_quality: int = 85, stale_after_turns: int = 3, max_cached: int = 32):
+        self.max_dimension = max_dimension
+        self.max_image_bytes = max_image_bytes
+        self.jpeg_quality = jpeg_quality
+        self.stale_after_turns = stale_after_turns
+        self.max_cached = max_cached
+        self.by_digest = OrderedDict()
+        self.by_data = {}
+        self.file_digests = {}
+
+    def add_image(self, image_path: str) -> Attachment:
+        stat = os.stat(image_path)
+        file_key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+        digest = self.file_digests.get(file_key)
+        if digest in self.by_digest:
+            self.by_digest.move_to_end(digest)
+            return self.by_digest[digest]
+
+        with open(image_path, "rb") as image_file:
+            raw = image_file.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        self.file_digests[file_key] = digest
+        if digest in self.by_digest:
+            self.by_digest.move_to_end(digest)
+            return self.by_digest[digest]
+
+        mime = mimetypes.guess_type(image_path)[0] or "image/jpeg"
+        raw, mime = self._shrink(raw, mime)
+        data_url = f"data:{mime};base64,{base64.b64encode(raw).decode('utf-8')}"
+        return self._store(Attachment(digest, mime, data_url, os.path.basename(image_path), len(raw)))
+
+    def add_audio(self, audio, audio_format: str = "wav") -> Attachment:
+        """`audio` is a file object or bytes; it is base64-encoded in chunks (see audio.encode_audio)."""
+        from audio import encode_audio
+        data = encode_audio(audio)
+        digest = hashlib.sha256(data.encode('ascii')).hexdigest()
+        if digest in self.by_digest:
+            self.by_digest.move_to_end(digest)
+            return self.by_digest[digest]
+        name = os.path.basename(getattr(audio, 'name', None) or "") or "recording"
+        return self._store(Attachment(digest, f"audio/{audio_format}", data, name, len(data) * 3 // 4, "audio", audio_format))
+
+    def _store(self, attachment: Attachment) -> Attachment:
+        self.by_digest[attachment.digest] = attachment
+        self.by_data[attachment.data] = attachment
+        self._evict()
+        return attachment
+
+    def find(self, data: str) -> Attachment:
+        """Returns the attachment behind a data URL / base64 audio produced by this store, or None."""
+        return self.by_data.get(data)
+
+    def placeholder(self, kind: str, data: str) -> dict:
+        """Placeholder for an image or audio part, also for ones this store does not (or no longer) hold."""
+        attachment = self.find(data)
+        if attachment is not None:
+            return attachment.placeholder_part()
+        return placeholder_part(kind, "attachment", hashlib.sha256(data.encode('utf-8')).hexdigest())
+
+    def _shrink(self, raw: bytes, mime: str):
+        try:
+            from PIL import Image
+        except ImportError:
+            return raw, mime
+        try:
+            image = Image.open(io.BytesIO(raw))
+            too_big = max(image.size) > self.max_dimension
+            if not too_big and len(raw) <= self.max_image_bytes:
+                return raw, mime
+            image.thumbnail((self.max_dimension, self.max_dimension))
+            output = io.BytesIO()
+            image.convert("RGB").save(output, format="JPEG", quality=self.jpeg_quality, optimize=True)
+            return output.getvalue(), "image/jpeg"
+        except Exception:
+            # Unreadable by Pillow: send it as is and let the API decide
+            return raw, mime
+
+    def _evict(self):
+        while len(self.by_digest) > self.max_cached:
+            _, attachment = self.by_digest.popitem(last=False)
+            self.by_data.pop(attachment.data, None)
+            self.file_digests = {key: digest for key, digest in self.file_digests.items() if digest != attachment.digest}
@@ -0,0 +1,247 @@
+import base64
+import io
+import os
+import shutil
+import subprocess
+import threading
+import time
+import wave
+
+# Voice input encoding and streamed playback for the gpt-4o-audio path
+
+SAMPLE_RATE = 24000   # pcm16 from the audio models: 24 kHz, 16-bit, mono
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+BYTES_PER_SECOND = SAMPLE_RATE * SAMPLE_WIDTH * CHANNELS
+_ENCODE_CHUNK = 3 * 65536   # a multiple of 3, so the pieces concatenate into one valid base64 string
+
+
+def encode_audio(audio) -> str:
+    """
+    Base64 of a file object (or bytes). Files are read and encoded piece by piece, so the raw
+    audio is never held in memory as a whole next to its encoding.
+    """
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        return base64.b64encode(audio).decode('ascii')
+    parts = []
+    while True:
+        chunk = audio.read(_ENCODE_CHUNK)
+        if not chunk:
+            break
+        parts.append(base64.b64encode(chunk).decode('ascii'))
+    return "".join(parts)
+
+
+def pcm_from_wav(data: bytes) -> bytes:
+    """The frames of a WAV file; anything else is assumed to be raw pcm16 already."""
+    if not data.startswith(b"RIFF"):
+        return data
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        return wav.readframes(wav.getnframes())
+
+
+class RingBuffer:
+    """Fixed-size byte ring between the stream reader (write) and the player thread (read)."""
+
+    def __init__(self, capacity: int):
+        self.buffer = bytearray(capacity)
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+        self.closed = False
+        self.aborted = False
+        self.condition = threading.Condition()
+
+    def write(self, data: bytes):
+        """Copies `data` in, waiting for the reader while the ring is full."""
+        view = memoryview(data)
+        while view:
+            with self.condition:
+                while self.size == self.capacity and not self.aborted:
+                    self.condition.wait()
+                if self.aborted:
+                    return
+                count = min(len(view), self.capacity - self.size)
+                end = (self.start + self.size) % self.capacity
+                first = min(count, self.capacity - end)
+                self.buffer[end:end + first] = view[:first]
+                self.buffer[:count - first] = view[first:count]
+                self.size += count
+                self.condition.notify_all()
+            view = view[count:]
+
+    def read(self, max_bytes: int, min_bytes: int = 1) -> bytes:
+        """Waits for at least `min_bytes` (less once closed); b"" means the stream is over."""
+        with self.condition:
+            while self.size < min_bytes and not self.closed:
+                self.condition.wait()
+            count = min(self.size, max_bytes)
+            if count == 0 or self.aborted:
+                return b""
+            first = min(count, self.capacity - self.start)
+            data = bytes(self.buffer[self.start:self.start + first]) + bytes(self.buffer[:count - first])
+            self.start = (self.start + count) % self.capacity
+            self.size -= count
+            self.condition.notify_all()
+            return data
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def abort(self):
+        with self.condition:
+            self.closed = self.aborted = True
+            self.condition.notify_all()
+
+
+class FileSink:
+    """Writes every response to a WAV file while it "plays"; works without a sound card."""
+
+    def __init__(self, path: str = "~/.cache/llm-cli/last-response.wav"):
+        self.path = os.path.expanduser(path)
+        self.wav = None
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.wav = wave.open(self.path, "wb")
+        self.wav.setnchannels(CHANNELS)
+        self.wav.setsampwidth(SAMPLE_WIDTH)
+        self.wav.setframerate(SAMPLE_RATE)
+
+    def write(self, pcm: bytes):
+        self.wav.writeframesraw(pcm)
+
+    def close(self):
+        if self.wav:
+            self.wav.close()
+            self.wav = None
+
+
+class PlayerSink:
+    """Pipes raw pcm16 into a command line player, started once per response."""
+
+    PLAYERS = {
+        "paplay": ["paplay", "--raw", "--format=s16le", f"--rate={SAMPLE_RATE}", f"--channels={CHANNELS}"],
+        "aplay": ["aplay", "-q", "-t", "raw", "-f", "S16_LE", "-r", str(SAMPLE_RATE), "-c", str(CHANNELS)],
+        "ffplay": ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "-"],
+    }
+
+    def __init__(self, command: list):
+        self.command = command
+        self.process = None
+
+    @classmethod
+    def find(cls):
+        for name, command in cls.PLAYERS.items():
+            if shutil.which(name):
+                return cls(command)
+        return None
+
+    def open(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def write(self, pcm: bytes):
+        try:
+            self.process.stdin.write(pcm)
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            pass  # the player went away; keep draining so the stream is not blocked
+
+    def close(self):
+        if self.process:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+            self.process.wait()
+            self.process = None
+
+
+class AudioPlayback:
+    """
+    Plays audio as it arrives: feed() decodes each base64 delta into a ring buffer and a
+    player thread moves it to the sink once `prebuffer_ms` have arrived, so playback starts
+    long before the response is complete. `sink` is "auto" (a command line player, or the
+    WAV file when there is none), "file", or an object with open/write/close.
+    """
+
+    def __init__(self, sink="auto", path: str = "~/.cache/llm-cli/last-response.wav", buffer_seconds: float = 60, prebuffer_ms: float = 100):
+        if sink == "auto":
+            sink = PlayerSink.find() or FileSink(path)
+        elif sink == "file":
+            sink = FileSink(path)
+        self.sink = sink
+        self.buffer_bytes = int(buffer_seconds * BYTES_PER_SECOND)
+        self.prebuffer_bytes = int(prebuffer_ms / 1000 * BYTES_PER_SECOND) // SAMPLE_WIDTH * SAMPLE_WIDTH
+        self.ring = None
+        self.thread = None
+        self.carry = b""
+        self.started = None
+        self.first_audio_latency = None   # seconds from begin() to the first bytes reaching the sink
+
+    def begin(self):
+        """Starts a new response, once the previous one has finished playing."""
+        self.finish()
+        self.ring = RingBuffer(self.buffer_bytes)
+        self.carry = b""
+        self.started = time.monotonic()
+        self.first_audio_latency = None
+        self.thread = threading.Thread(target=self._play, args=(self.ring,), daemon=True, name="audio")
+        self.thread.start()
+
+    def feed(self, data: str):
+        """Queues one base64 audio delta."""
+        if self.ring is None:
+            self.begin()
+        pcm = self.carry + base64.b64decode(data)
+        # Keep whole samples together
+        split = len(pcm) - len(pcm) % SAMPLE_WIDTH
+        self.carry = pcm[split:]
+        self.ring.write(pcm[:split])
+
+    def _play(self, ring: RingBuffer):
+        self.sink.open()
+        try:
+            data = ring.read(self.buffer_bytes, min_bytes=max(self.prebuffer_bytes, 1))
+            while data:
+                if self.first_audio_latency is None:
+                    self.first_audio_latency = time.monotonic() - self.started
+                self.sink.write(data)
+                data = ring.read(BYTES_PER_SECOND // 10)
+        finally:
+            self.sink.close()
+
+    def finish(self, wait: bool = True):
+        """
+        Ends the current response; with `wait` returns once everything has been played,
+        otherwise the rest plays in the background until begin() or wait().
+        """
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        if wait:
+            self.wait()
+
+    def wait(self):
+        """Blocks until the audio queued so far has been played."""
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def stop(self):
+        """Drops whatever has not been played yet."""
+        if self.ring is not None:
+            self.ring.abort()
+            self.ring = None
+        self.wait()
+
+    def play_audio(self, data: str):
+        """Plays a complete base64 response (WAV or raw pcm16), e.g. from a non-streamed request."""
+        pcm = pcm_from_wav(base64.b64decode(data))
+        self.begin()
+        step = BYTES_PER_SECOND // 10
+        for position in range(0, len(pcm), step):
+            self.ring.write(pcm[position:position + step])
+        self.finish(wait=False)
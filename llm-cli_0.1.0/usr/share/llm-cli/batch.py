@@ -0,0 +1,170 @@
+import json
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+# Bulk mode: run a JSONL file of prompts through fresh agents with bounded concurrency
+
+
+def read_done_ids(output_path: str) -> set:
+    """
+    IDs that succeeded in an earlier (possibly interrupted) output file. An id can appear
+    more than once when a failed record was retried; its last line is the one that counts.
+    """
+    succeeded = {}
+    try:
+        with open(output_path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a line cut short by a crash
+                if "id" in record:
+                    succeeded[str(record["id"])] = record.get("error") is None
+    except FileNotFoundError:
+        pass
+    return {record_id for record_id, ok in succeeded.items() if ok}
+
+
+def iter_records(input_file):
+    """Yields (id, record) for every JSONL line; records without an id use their line number."""
+    for number, line in enumerate(input_file, start=1):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if isinstance(record, str):
+            record = {"prompt": record}
+        yield str(record.get("id", number)), record
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class BatchRunner:
+    """
+    Each input record ({"id": ..., "prompt": ..., "system": optional}) runs through its own
+    Agent from `agent_factory(system_message)`; agents share the API handler and so the
+    connection pool. Input is streamed with at most 2 * concurrency records in flight, results
+    are written as they complete (or in input order with `ordered`), and records whose id is
+    already in the output file are skipped, so an interrupted run can simply be restarted.
+    Records that failed are run again on restart and their new line is appended, so readers
+    of the output should let the last line of an id supersede earlier ones.
+    """
+
+    def __init__(self, agent_factory, concurrency: int = 4, ordered: bool = False, release_agent=None):
+        self.agent_factory = agent_factory
+        self.concurrency = concurrency
+        self.ordered = ordered
+        self.release_agent = release_agent
+        self.latencies = []
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def _run_record(self, record_id: str, record: dict) -> dict:
+        started = time.monotonic()
+        agent = self.agent_factory(record.get("system"))
+        try:
+            response = agent.chat([{"type": "text", "text": record.get("prompt", "")}])
+            error = response if isinstance(response, str) and response.startswith("Request failed:") else None
+        except Exception as e:
+            response, error = None, f"{type(e).__name__}: {e}"
+        finally:
+            if self.release_agent:
+                self.release_agent(agent)
+        result = {"id": record_id, "response": None if error else response, "error": error,
+                  "latency_ms": round((time.monotonic() - started) * 1000, 1)}
+        return result
+
+    def run(self, input_file, output_file, done_ids: set = None) -> dict:
+        from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+        done_ids = done_ids or set()
+        started = time.monotonic()
+        pending = {}        # future -> sequence number
+        finished = {}       # sequence number -> result, waiting for its turn when ordered
+        next_to_write = 0
+        sequence = 0
+
+        def write(result):
+            output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output_file.flush()
+            self.latencies.append(result["latency_ms"])
+            if result["error"] is None:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+        def collect(futures):
+            nonlocal next_to_write
+            for future in futures:
+                number = pending.pop(future)
+                finished[number] = future.result()
+            if not self.ordered:
+                for number in sorted(finished):
+                    write(finished.pop(number))
+                return
+            while next_to_write in finished:
+                write(finished.pop(next_to_write))
+                next_to_write += 1
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+            for record_id, record in iter_records(input_file):
+                if record_id in done_ids:
+                    self.skipped += 1
+                    continue
+                pending[executor.submit(self._run_record, record_id, record)] = sequence
+                sequence += 1
+                if len(pending) >= 2 * self.concurrency:
+                    completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(completed)
+            while pending:
+                completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(completed)
+
+        elapsed = time.monotonic() - started
+        processed = self.succeeded + self.failed
+        return {
+            "processed": processed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_s": round(elapsed, 2),
+            "throughput_per_s": round(processed / elapsed, 2) if elapsed else 0.0,
+            "latency_p50_ms": percentile(self.latencies, 0.50),
+            "latency_p95_ms": percentile(self.latencies, 0.95),
+            "latency_max_ms": max(self.latencies) if self.latencies else 0.0,
+        }
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as file:
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b"\n"
+
+
+def run_batch(agent_factory, input_path: str, output_path: str = None, concurrency: int = 4, ordered: bool = False, release_agent=None) -> dict:
+    """
+    Runs a batch file; without output_path results go to stdout and nothing can be resumed.
+    Anything the agents print themselves (tool calls, thoughts) goes to stderr meanwhile,
+    so stdout only carries the JSONL results.
+    """
+    runner = BatchRunner(agent_factory, concurrency=concurrency, ordered=ordered, release_agent=release_agent)
+    done_ids = read_done_ids(output_path) if output_path else set()
+    input_file = sys.stdin if input_path == "-" else open(input_path, "r", encoding="utf-8")
+    output_file = open(output_path, "a", encoding="utf-8") if output_path else sys.stdout
+    if output_path and output_file.tell() > 0 and not _ends_with_newline(output_path):
+        output_file.write("\n")  # the previous run died mid-line
+    try:
+        with redirect_stdout(sys.stderr):
+            return runner.run(input_file, output_file, done_ids)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
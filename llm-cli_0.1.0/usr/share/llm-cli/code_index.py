@@ -0,0 +1,631 @@
+import os
+import re
+import stat
+import subprocess
+import threading
+import time
+from array import array
+
+# Trigram index of a source tree for search_code/find_files, kept on disk and updated by mtime/size
+
+_WORDS = re.compile(rb"\w{3,}")
+_INLINE_FLAGS = re.compile(r"\(\?[aiLmsux]+\)")
+_DEFINITION = re.compile(r"^\s*(def|class|function|func|fn|interface|struct|enum|type|const|let|var|public|private|protected|static|export)\b")
+_VERSION = 1
+
+
+def trigrams(data: bytes) -> set:
+    """
+    Trigrams of the (ASCII-lowercased) word runs in `data`. Punctuation is left out, which keeps
+    the index small and building it fast; queries are reduced the same way, so the candidates
+    for a query are always a superset of the files that match it.
+    """
+    return {word[i:i + 3] for word in set(_WORDS.findall(data.lower())) for i in range(len(word) - 2)}
+
+
+def required_literals(pattern: str) -> list:
+    """
+    Literal runs every match of the regex `pattern` must contain. Conservative: alternations and
+    leading inline flags such as (?i) give nothing, and text inside groups or classes and characters
+    made optional by ?, * or {} are skipped.
+    """
+    if "|" in pattern or _INLINE_FLAGS.match(pattern):
+        return []
+    literals, current = [], []
+    depth = 0
+    position = 0
+    while position < len(pattern):
+        character = pattern[position]
+        literal = None
+        if character == "\\" and position + 1 < len(pattern):
+            escaped = pattern[position + 1]
+            position += 2
+            if not escaped.isalnum():
+                literal = escaped
+        elif character == "[":
+            end = pattern.find("]", position + 2)
+            position = len(pattern) if end < 0 else end + 1
+        else:
+            position += 1
+            if character == "(":
+                depth += 1
+            elif character == ")":
+                depth = max(depth - 1, 0)
+            elif character not in ".^$*+?{}":
+                literal = character
+        optional = position < len(pattern) and pattern[position] in "?*{"
+        if literal is not None and depth == 0 and not optional:
+            current.append(literal)
+        else:
+            literals.append("".join(current))
+            current = []
+    literals.append("".join(current))
+    return [literal for literal in literals if literal]
+
+
+def glob_regex(pattern: str, flags: int = 0):
+    """
+    Compiles a gitignore-style glob: * and ? stay within one path segment, **/ spans any
+    number of directories. Used for .gitignore rules and the glob arguments of the tools.
+    """
+    out = []
+    position = 0
+    while position < len(pattern):
+        if pattern.startswith("**/", position):
+            out.append("(?:.*/)?")
+            position += 3
+            continue
+        if pattern.startswith("/**", position) and position + 3 == len(pattern):
+            out.append("/.*")
+            break
+        character = pattern[position]
+        if character == "*":
+            out.append(".*" if pattern.startswith("**", position) else "[^/]*")
+            position += 2 if pattern.startswith("**", position) else 1
+            continue
+        if character == "?":
+            out.append("[^/]")
+        elif character == "[" and "]" in pattern[position + 2:]:
+            end = pattern.index("]", position + 2)
+            body = pattern[position + 1:end]
+            out.append("[" + ("^" + body[1:] if body.startswith("!") else body) + "]")
+            position = end
+        else:
+            out.append(re.escape(character))
+        position += 1
+    return re.compile("".join(out) + r"\Z", flags)
+
+
+def _read_ignore_file(path: str, base: str) -> list:
+    """Rules of one .gitignore as (base, regex, negated, directories only, anchored)."""
+    rules = []
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as file:
+            lines = file.read().splitlines()
+    except OSError:
+        return rules
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        line = line[1:] if negated else line
+        directories_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        rules.append((base, glob_regex(line.lstrip("/")), negated, directories_only, anchored))
+    return rules
+
+
+def _ignored(rules: list, relative: str, is_directory: bool) -> bool:
+    ignored = False
+    for base, regex, negated, directories_only, anchored in rules:
+        if directories_only and not is_directory:
+            continue
+        if base:
+            if not relative.startswith(base + "/"):
+                continue
+            path = relative[len(base) + 1:]
+        else:
+            path = relative
+        if regex.match(path if anchored else path.rsplit("/", 1)[-1]):
+            ignored = not negated
+    return ignored
+
+
+def walk_files(root: str, max_files: int = 100000) -> list:
+    """Relative paths of the files under `root`, without .git and what .gitignore files exclude."""
+    files = []
+    pending = [("", _read_ignore_file(os.path.join(root, ".gitignore"), ""))]
+    while pending and len(files) < max_files:
+        relative_directory, rules = pending.pop()
+        try:
+            entries = list(os.scandir(os.path.join(root, relative_directory)))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name == ".git":
+                continue
+            relative = f"{relative_directory}/{entry.name}" if relative_directory else entry.name
+            try:
+                is_directory = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if _ignored(rules, relative, is_directory):
+                continue
+            if is_directory:
+                pending.append((relative, rules + _read_ignore_file(os.path.join(entry.path, ".gitignore"), relative)))
+            elif entry.is_file():
+                files.append(relative)
+    return files[:max_files]
+
+
+def git_root(directory: str):
+    try:
+        result = subprocess.run(["git", "-C", directory, "rev-parse", "--show-toplevel"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+
+def git_files(root: str):
+    """Tracked and untracked-but-not-ignored files as git sees them, or None outside a work tree."""
+    try:
+        result = subprocess.run(["git", "-C", root, "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+                                capture_output=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    return list(dict.fromkeys(os.fsdecode(path) for path in result.stdout.split(b"\0") if path))
+
+
+def git_state(root: str):
+    """(HEAD commit or None, set of paths git status reports as changed or untracked), or None outside a work tree."""
+    try:
+        result = subprocess.run(["git", "-C", root, "status", "--porcelain=v2", "-z", "--branch", "--no-renames",
+                                 "--untracked-files=all"], capture_output=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    head, paths = None, set()
+    for entry in result.stdout.split(b"\0"):
+        if entry.startswith(b"# branch.oid "):
+            oid = entry[13:].decode()
+            head = None if oid == "(initial)" else oid
+        elif entry[:2] in (b"1 ", b"u "):
+            # "1 XY sub mH mI mW hH hI path" and "u XY sub m1 m2 m3 mW h1 h2 h3 path"
+            paths.add(os.fsdecode(entry.split(b" ", 8 if entry[:1] == b"1" else 10)[-1]))
+        elif entry.startswith(b"? "):
+            paths.add(os.fsdecode(entry[2:]))
+    return head, paths
+
+
+def git_changed_between(root: str, old: str, new: str):
+    """Paths that differ between two commits, or None if git cannot tell."""
+    try:
+        result = subprocess.run(["git", "-C", root, "diff", "--name-only", "--no-renames", "-z", old, new],
+                                capture_output=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    return {os.fsdecode(path) for path in result.stdout.split(b"\0") if path}
+
+
+class Matcher:
+    """
+    Where a query occurs in a text. Plain text is found with str.find (on the lowercased text
+    when case does not matter), several times faster than an IGNORECASE regex; regexes use re.
+    Raises re.error for an invalid regex.
+    """
+
+    def __init__(self, query: str, regex: bool = False, case_sensitive: bool = False):
+        # Whole files are searched, so ^ and $ must anchor at every line as they would in grep
+        self.pattern = re.compile(query if regex else re.escape(query), re.MULTILINE | (0 if case_sensitive else re.IGNORECASE))
+        self.needle = None if regex else (query if case_sensitive else query.lower())
+        self.fold = not case_sensitive
+        # What the trigram index can filter on
+        self.literals = required_literals(query) if regex else [query]
+        self.required = [literal.lower() if self.fold else literal for literal in self.literals]
+
+    def starts(self, text: str):
+        haystack = text.lower() if self.fold else text
+        # The trigram index only knows words; a quick look for the whole literals rules most false candidates out
+        if any(literal not in haystack for literal in self.required):
+            return
+        if self.needle and len(haystack) == len(text):  # lower() can change lengths for a few characters; positions must line up
+            position = haystack.find(self.needle)
+            while position >= 0:
+                yield position
+                position = haystack.find(self.needle, position + len(self.needle))
+            return
+        for match in self.pattern.finditer(text):
+            yield match.start()
+
+    def found_in(self, text: str) -> bool:
+        return next(self.starts(text), None) is not None
+
+
+class SearchResult:
+    """The matches of one file, as (line number, line) for the first few."""
+
+    def __init__(self, path: str, lines: list, count: int, score: float):
+        self.path = path
+        self.lines = lines
+        self.count = count
+        self.score = score
+
+
+class CodeIndex:
+    """
+    Trigram -> file ids for every text file under `root`. Files are checked by mtime/size on
+    refresh and only new or changed ones are read; a changed file gets a new id and its old
+    one becomes a tombstone, squeezed out once tombstones outnumber live files. The index is
+    pickled to `cache_path`, so a new process only re-reads what changed since.
+
+    A full refresh (listing and stat-ing the tree) happens when the index is older than
+    `refresh_interval` seconds; paths passed to invalidate() are rechecked on their own before
+    the next search. An index marked stale (after a shell command) in a git work tree only
+    rechecks what git status reports now or reported last time, plus the files that differ
+    between the old and new HEAD; outside git it gets a full refresh.
+    """
+
+    def __init__(self, root: str, cache_path: str = None, max_file_bytes: int = 1000000, max_files: int = 100000,
+                 refresh_interval: float = 30.0, save_interval: float = 30.0):
+        self.root = os.path.abspath(root)
+        self.cache_path = cache_path
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.refresh_interval = refresh_interval
+        self.save_interval = save_interval
+        self.paths = []            # id -> relative path, None once superseded
+        self.versions = []         # id -> (mtime_ns, size)
+        self.text = bytearray()    # id -> 1 if the file was indexed (not binary, not too large)
+        self.ids = {}              # relative path -> current id
+        self.postings = {}         # trigram -> array of ids, ascending
+        self.dead = 0
+        self.refreshed = None
+        self.stale = False
+        self.dirty = set()
+        self.git_state = None      # (HEAD, changed paths) as of the last refresh, in a git work tree
+        self.unsaved = 0
+        self.saved = None
+        self.lock = threading.Lock()
+        self._load()
+
+    # Persistence
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        import pickle
+        try:
+            with open(self.cache_path, "rb") as file:
+                state = pickle.load(file)
+            if state.get("version") != _VERSION or state.get("root") != self.root:
+                return
+            self.paths, self.versions, self.text, self.postings = state["paths"], state["versions"], state["text"], state["postings"]
+        except Exception:  # unreadable or from an older layout: rebuild
+            self.paths, self.versions, self.text, self.postings = [], [], bytearray(), {}
+            return
+        self.ids = {path: number for number, path in enumerate(self.paths) if path is not None}
+        self.dead = len(self.paths) - len(self.ids)
+
+    def save(self):
+        if not self.cache_path:
+            return
+        import pickle
+        import tempfile
+        directory = os.path.dirname(self.cache_path)
+        os.makedirs(directory, exist_ok=True)
+        state = {"version": _VERSION, "root": self.root, "paths": self.paths, "versions": self.versions,
+                 "text": self.text, "postings": self.postings}
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.cache_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        self.unsaved = 0
+        self.saved = time.monotonic()
+
+    # Updating
+
+    def invalidate(self, relative: str):
+        self.dirty.add(relative)
+
+    def refresh(self, force: bool = False):
+        """Brings the index up to date with the tree. Returns the number of files (re)indexed or dropped."""
+        with self.lock:
+            now = time.monotonic()
+            dirty, self.dirty = self.dirty, set()  # invalidate() does not take the lock
+            if force or self.refreshed is None or now - self.refreshed > self.refresh_interval:
+                self.stale = False
+                changed = self._full_refresh()
+                self.refreshed = now
+            elif self.stale:
+                self.stale = False
+                changed = self._changed_refresh(dirty)
+            else:
+                changed = sum(self._check(path) for path in dirty)
+            if self.dead > max(1000, len(self.ids)):
+                self._compact()
+            self.unsaved += changed
+            # The first change is saved at once (a one-shot CLI run may not live long), later ones every save_interval
+            if self.unsaved and (self.saved is None or self.unsaved > 1000 or time.monotonic() - self.saved > self.save_interval):
+                try:
+                    self.save()
+                except OSError:
+                    pass  # the cache is only an optimization
+            return changed
+
+    def _full_refresh(self) -> int:
+        # Taken first, so what changes while the tree is listed is rechecked next time
+        self.git_state = git_state(self.root)
+        listed = git_files(self.root)
+        if listed is None:
+            listed = walk_files(self.root, self.max_files)
+        listed = listed[:self.max_files]
+        changed = sum(self._check(path) for path in listed)
+        present = set(listed)
+        for path in [path for path in self.ids if path not in present]:
+            self._remove(path)
+            changed += 1
+        return changed
+
+    def _changed_refresh(self, dirty: set) -> int:
+        previous, current = self.git_state, git_state(self.root)
+        if previous is None or current is None or previous[0] is None or current[0] is None:
+            changed = self._full_refresh()
+            self.refreshed = time.monotonic()
+            return changed
+        paths = dirty | previous[1] | current[1]
+        if current[0] != previous[0]:
+            committed = git_changed_between(self.root, previous[0], current[0])
+            if committed is None:
+                changed = self._full_refresh()
+                self.refreshed = time.monotonic()
+                return changed
+            paths |= committed
+        self.git_state = current
+        return sum(self._check(path) for path in paths)
+
+    def _check(self, relative: str) -> int:
+        """Re-indexes `relative` if it is new or changed, drops it if it is gone. Returns 1 if anything changed."""
+        try:
+            status = os.stat(os.path.join(self.root, relative))
+        except OSError:
+            status = None
+        if status is None or not stat.S_ISREG(status.st_mode):
+            if relative in self.ids:
+                self._remove(relative)
+                return 1
+            return 0
+        version = (status.st_mtime_ns, status.st_size)
+        number = self.ids.get(relative)
+        if number is not None and self.versions[number] == version:
+            return 0
+        if number is not None:
+            self._remove(relative)
+        self._add(relative, version)
+        return 1
+
+    def _add(self, relative: str, version: tuple):
+        data = None
+        if version[1] <= self.max_file_bytes:
+            try:
+                with open(os.path.join(self.root, relative), "rb") as file:
+                    data = file.read()
+            except OSError:
+                pass
+            if data is not None and b"\0" in data[:8192]:
+                data = None
+        number = len(self.paths)
+        self.paths.append(relative)
+        self.versions.append(version)
+        self.text.append(1 if data is not None else 0)
+        self.ids[relative] = number
+        if data:
+            postings = self.postings
+            for trigram in trigrams(data):
+                entry = postings.get(trigram)
+                if entry is None:
+                    entry = postings[trigram] = array("I")
+                entry.append(number)
+
+    def _remove(self, relative: str):
+        number = self.ids.pop(relative)
+        self.paths[number] = None
+        self.dead += 1
+
+    def _compact(self):
+        # Renumber the live files in order and drop tombstones from the postings; no file is read again
+        mapping = array("i", [-1]) * len(self.paths)
+        paths, versions, text = [], [], bytearray()
+        for number, path in enumerate(self.paths):
+            if path is not None:
+                mapping[number] = len(paths)
+                paths.append(path)
+                versions.append(self.versions[number])
+                text.append(self.text[number])
+        postings = {}
+        for trigram, entry in self.postings.items():
+            kept = array("I", [mapping[number] for number in entry if mapping[number] >= 0])
+            if kept:
+                postings[trigram] = kept
+        self.paths, self.versions, self.text, self.postings = paths, versions, text, postings
+        self.ids = {path: number for number, path in enumerate(paths)}
+        self.dead = 0
+        self.unsaved += 1
+
+    # Queries
+
+    def live_files(self) -> list:
+        return list(self.ids)
+
+    def candidates(self, literals: list) -> list:
+        """Ids of the text files that may contain all of `literals` (every text file when there is nothing to filter on)."""
+        wanted = set()
+        for literal in literals:
+            wanted |= trigrams(literal.encode("utf-8"))
+        if not wanted:
+            return [number for number in self.ids.values() if self.text[number]]
+        lists = []
+        for trigram in wanted:
+            entry = self.postings.get(trigram)
+            if entry is None:
+                return []
+            lists.append(entry)
+        lists.sort(key=len)
+        found = set(lists[0])
+        for entry in lists[1:]:
+            found.intersection_update(entry)
+            if not found:
+                return []
+        return sorted(number for number in found if self.paths[number] is not None)
+
+    def search(self, matcher: Matcher, include=None, max_files: int = 20, lines_per_file: int = 5):
+        """
+        Files containing a match, best first: (results, total matches, files matching, candidates
+        scanned). `include(relative path)` filters the files looked at.
+        """
+        with self.lock:
+            numbers = self.candidates(matcher.literals)
+            results = []
+            total = 0
+            scanned = 0
+            for number in numbers:
+                relative = self.paths[number]
+                if include is not None and not include(relative):
+                    continue
+                scanned += 1
+                result = self._search_file(relative, matcher, lines_per_file)
+                if result is not None:
+                    results.append(result)
+                    total += result.count
+        results.sort(key=lambda result: (-result.score, result.path))
+        return results[:max_files], total, len(results), scanned
+
+    def _search_file(self, relative: str, matcher: Matcher, lines_per_file: int):
+        try:
+            with open(os.path.join(self.root, relative), "rb") as file:
+                text = file.read().decode("utf-8", errors="replace")
+        except OSError:
+            self.dirty.add(relative)
+            return None
+        lines = []
+        count = 0
+        definitions = 0
+        line_number = 1
+        position = 0
+        last_line = None
+        for start in matcher.starts(text):
+            count += 1
+            line_number += text.count("\n", position, start)
+            position = start
+            if line_number == last_line:
+                continue
+            last_line = line_number
+            start = text.rfind("\n", 0, position) + 1
+            end = text.find("\n", position)
+            line = text[start:end if end >= 0 else len(text)]
+            if _DEFINITION.match(line):
+                definitions += 1
+            if len(lines) < lines_per_file:
+                lines.append((line_number, line.strip()))
+        if not count:
+            return None
+        name = relative.rsplit("/", 1)[-1].lower()
+        score = 5 * definitions + min(count, 10) - 0.1 * relative.count("/")
+        if matcher.found_in(name):
+            score += 3
+        return SearchResult(relative, lines, count, score)
+
+    def find(self, query: str, include=None, max_results: int = 50):
+        """Paths matching a glob (if `query` has * ? or [) or containing `query`, best first. Returns (paths, total)."""
+        with self.lock:
+            paths = [path for path in self.ids if include is None or include(path)]
+        if any(character in query for character in "*?["):
+            regex = glob_regex(query, re.I)
+            matched = [path for path in paths if regex.match(path) or regex.match(path.rsplit("/", 1)[-1])]
+            matched.sort(key=lambda path: (path.count("/"), len(path), path))
+            return matched[:max_results], len(matched)
+        needle = query.lower().strip("/")
+        ranked = []
+        for path in paths:
+            lowered = path.lower()
+            if needle not in lowered:
+                continue
+            name = lowered.rsplit("/", 1)[-1]
+            if name == needle or name.rsplit(".", 1)[0] == needle:
+                rank = 0
+            elif name.startswith(needle):
+                rank = 1
+            elif needle in name:
+                rank = 2
+            else:
+                rank = 3
+            ranked.append((rank, path.count("/"), len(path), path))
+        ranked.sort()
+        return [entry[3] for entry in ranked[:max_results]], len(ranked)
+
+
+class CodeIndexCache:
+    """One CodeIndex per repository (the git top level, else the directory searched), shared by the tools."""
+
+    def __init__(self, directory: str = "~/.cache/llm-cli/code-index", max_file_bytes: int = 1000000,
+                 max_files: int = 100000, refresh_interval: float = 30.0):
+        self.directory = os.path.expanduser(directory) if directory else None
+        self.settings = {"max_file_bytes": max_file_bytes, "max_files": max_files, "refresh_interval": refresh_interval}
+        self.indexes = {}
+        self.roots = {}
+        self.lock = threading.Lock()
+
+    def get(self, directory: str):
+        """(index, path of `directory` relative to the index root, "" for the root itself)."""
+        directory = os.path.abspath(directory)
+        if not os.path.isdir(directory):
+            raise NotADirectoryError(f"no such directory: {directory}")
+        with self.lock:
+            root = self.roots.get(directory)
+            if root is None:
+                root = self.roots[directory] = git_root(directory) or directory
+            index = self.indexes.get(root)
+            if index is None:
+                index = self.indexes[root] = CodeIndex(root, self._cache_path(root), **self.settings)
+        relative = os.path.relpath(directory, root)
+        return index, "" if relative == "." else relative.replace(os.sep, "/")
+
+    def _cache_path(self, root: str):
+        if not self.directory:
+            return None
+        import hashlib
+        return os.path.join(self.directory, hashlib.sha1(root.encode("utf-8")).hexdigest()[:16] + ".pickle")
+
+    def invalidate(self, path: str):
+        """Rechecks `path` before the next query of the index containing it."""
+        path = os.path.abspath(path)
+        for root, index in list(self.indexes.items()):
+            if path.startswith(root + os.sep):
+                index.invalidate(os.path.relpath(path, root).replace(os.sep, "/"))
+
+    def mark_stale(self):
+        """Something outside the file tools (e.g. a shell command) may have changed the trees: rescan them on next use."""
+        for index in list(self.indexes.values()):
+            index.stale = True
+
+    def save_all(self):
+        for index in list(self.indexes.values()):
+            with index.lock:
+                if index.unsaved:
+                    try:
+                        index.save()
+                    except OSError:
+                        pass
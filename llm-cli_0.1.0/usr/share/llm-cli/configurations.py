@@ -17,6 +17,114 @@ class Configurations:
             "URL": "https://api.openai.com",
             "chat": "https://tsachs2-2331-resource.cognitiveservices.azure.com/openai/deployments/o3-mini/chat/completions?api-version=2025-01-01-preview",  
         }
+        # Chat backends for router.Router. With more than one, each request goes to the healthiest
+        # (lowest latency / weight, penalised by errors) and fails over when it is throttled or down.
+        # "model" is a name for every request or a {requested: backend} mapping; "headers" default to headers["chat"].
+        self.backends = [
+            {"name": "azure", "url": self.endpoints["chat"], "weight": 1.0},
+            # {"name": "openai", "url": f"{self.base_url}/chat/completions", "model": "o3-mini", "weight": 0.5,
+            #  "headers": {"Content-Type": "application/json", "Authorization": "Bearer <OPENAI_API_KEY>"}},
+        ]
+        # hedge_after: seconds (or "p95") before a slow request is duplicated to the next backend; None = never
+        self.routing = {
+            "hedge_after": None,
+            "cooldown": 30.0,
+            "failure_threshold": 3,
+            "probe_interval": 60.0,
+        }
+        # Connection pool and timeouts (seconds) for transport.Transport
+        self.transport = {
+            "pool_connections": 4,
+            "pool_maxsize": 16,
+            "connect_timeout": 10,
+            "read_timeout": 300,
+            # "auto" uses orjson when installed, else "json"; encoded messages are kept up to body_cache_bytes
+            "json_codec": "auto",
+            "body_cache_bytes": 64000000,
+        }
+        # Client-side pacing shared by every agent in the process (None = only follow the server headers)
+        self.rate_limits = {
+            "requests_per_minute": None,
+            "tokens_per_minute": None,
+        }
+        # Backoff for 429/5xx/connection errors, see rate_limiter.RetryPolicy
+        self.retry = {
+            "max_retries": 5,
+            "base_delay": 0.5,
+            "max_delay": 30.0,
+        }
+        # Concurrent execution of the tool calls of one turn, see tool_dispatcher.ToolDispatcher
+        self.tools = {
+            "max_workers": 4,
+            "timeout": 120,
+            "tool_timeouts": {"execute_terminal": 600, "execute_task": 1800},
+        }
+        # Tool schemas sent with each request: "all", or "relevant" for only the tools whose pattern
+        # matches the latest user message (execute_terminal is always sent); fewer prompt tokens per turn
+        self.tool_selection = "all"
+        # execute_task: a planner splits the task and up to max_workers executor agents run the subtasks,
+        # see task_scheduler.TaskScheduler; timeout (seconds) covers the whole task
+        self.tasks = {
+            "max_workers": 4,
+            "timeout": 1500,
+        }
+        # Prompt budget for context_window.ContextWindow
+        self.context = {
+            "max_prompt_tokens": 100000,
+            "keep_recent_turns": 6,
+            "tool_output_chars": 2000,
+        }
+        # Image handling for attachments.AttachmentStore
+        self.attachments = {
+            "max_dimension": 2048,
+            "max_image_bytes": 4000000,
+            "jpeg_quality": 85,
+            "stale_after_turns": 3,
+            "max_cached": 32,
+        }
+        # Voice answers, see audio.AudioPlayback: sink "auto" plays through paplay/aplay/ffplay if installed,
+        # otherwise (or with "file") every answer is written to `path` as it arrives
+        self.audio = {
+            "sink": "auto",
+            "path": "~/.cache/llm-cli/last-response.wav",
+            "buffer_seconds": 60,
+            "prebuffer_ms": 100,
+        }
+        # Persistent shells for execute_terminal, see shell_pool.ShellPool
+        self.shells = {
+            "max_sessions": 4,
+            "max_output_bytes": 64000,
+        }
+        # Trigram index behind search_code/find_files, see code_index.CodeIndex; refreshed by mtime/size
+        # at most every refresh_interval seconds (and after every execute_terminal command)
+        self.code_search = {
+            "directory": "~/.cache/llm-cli/code-index",
+            "max_file_bytes": 1000000,
+            "max_files": 100000,
+            "refresh_interval": 30.0,
+        }
+        # Resident daemon (llm --serve); socket None = $XDG_RUNTIME_DIR/llm-cli.sock or /tmp/llm-cli-<uid>.sock
+        self.daemon = {
+            "enabled": True,
+            "socket": None,
+        }
+        # Saved conversations (llm --session NAME); fsync makes every message durable at the cost of a disk flush
+        self.sessions = {
+            "directory": "~/.local/share/llm-cli/sessions",
+            "fsync": False,
+            "compact_keep_turns": 200,
+        }
+        # Always export per-turn profiles here (JSON lines, or Prometheus counters for *.prom), see instrumentation.py
+        self.profile = {
+            "export": None,
+        }
+        # Opt-in response cache for one-shot questions (llm --cache), see response_cache.ResponseCache
+        self.response_cache = {
+            "enabled": False,
+            "path": "~/.cache/llm-cli/responses.sqlite3",
+            "ttl": 86400,
+            "max_bytes": 50000000,
+        }
 
     def get_api_key(self):
         return self.API_KEY
@@ -0,0 +1,199 @@
+import json
+
+# Keeps the prompt sent to the model under a token budget without touching Agent.messages
+
+_ENCODING = None
+_ENCODING_LOADED = False
+
+# Flat estimates for non-text parts (a low-detail image is 85 tokens, a full one a few hundred)
+IMAGE_TOKENS = 765
+AUDIO_TOKENS = 1000
+MESSAGE_OVERHEAD = 4
+
+
+def _get_encoding():
+    # tiktoken is slow to import, so it is only loaded once something is actually counted
+    global _ENCODING, _ENCODING_LOADED
+    if not _ENCODING_LOADED:
+        _ENCODING_LOADED = True
+        try:
+            import tiktoken
+            _ENCODING = tiktoken.get_encoding("o200k_base")
+        except Exception:  # tiktoken missing or its encoding files unavailable
+            _ENCODING = None
+    return _ENCODING
+
+
+def count_text_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def count_message_tokens(message: dict) -> int:
+    tokens = MESSAGE_OVERHEAD
+    content = message.get('content')
+    if isinstance(content, str):
+        tokens += count_text_tokens(content)
+    elif isinstance(content, list):
+        for part in content:
+            if part.get('type') == 'text':
+                tokens += count_text_tokens(part.get('text', ''))
+            elif part.get('type') == 'image_url':
+                tokens += IMAGE_TOKENS
+            elif part.get('type') == 'input_audio':
+                tokens += AUDIO_TOKENS
+            else:
+                tokens += count_text_tokens(json.dumps(part))
+    for tool_call in message.get('tool_calls') or []:
+        function = tool_call.get('function', {})
+        tokens += count_text_tokens(function.get('name', '')) + count_text_tokens(function.get('arguments', ''))
+    return tokens
+
+
+class ContextReport:
+    """What ContextWindow.fit did to one request."""
+
+    def __init__(self, original_tokens: int, sent_tokens: int, dropped_messages: int = 0, truncated_messages: int = 0):
+        self.original_tokens = original_tokens
+        self.sent_tokens = sent_tokens
+        self.dropped_messages = dropped_messages
+        self.truncated_messages = truncated_messages
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.sent_tokens
+
+    def __str__(self):
+        return (f"context: {self.sent_tokens} tokens sent, {self.saved_tokens} saved "
+                f"({self.dropped_messages} messages dropped, {self.truncated_messages} tool outputs truncated)")
+
+
+class ContextWindow:
+    """
+    Builds the message list for a request so that it fits in `max_prompt_tokens`:
+
+    1. the system message is always kept,
+    2. the last `keep_recent_turns` turns (a user message and everything after it) are kept verbatim if possible,
+    3. older tool outputs are cut down to `tool_output_chars` (head and tail kept),
+    4. then the oldest messages are dropped, an assistant `tool_calls` message always together with its tool replies,
+    5. as a last resort tool outputs inside the recent turns are cut down too.
+
+    The history itself is never modified; unchanged messages are passed through as the same objects.
+    """
+
+    def __init__(self, max_prompt_tokens: int = 100000, keep_recent_turns: int = 6, tool_output_chars: int = 2000):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.tool_output_chars = tool_output_chars
+        self._token_cache = {}
+        self._truncated_cache = {}
+
+    def tokens(self, message: dict) -> int:
+        # Cached per message object; replacing the content (e.g. removing an image) invalidates the entry
+        cached = self._token_cache.get(id(message))
+        if cached and cached[0] is message and cached[1] is message.get('content'):
+            return cached[2]
+        count = count_message_tokens(message)
+        self._token_cache[id(message)] = (message, message.get('content'), count)
+        return count
+
+    def fit(self, messages: list):
+        """Returns (messages to send, ContextReport)."""
+        sizes = [self.tokens(message) for message in messages]
+        original = sum(sizes)
+        self._forget_unused(messages)
+        if original <= self.max_prompt_tokens:
+            return messages, ContextReport(original, original)
+
+        pinned = 1 if messages and messages[0].get('role') == 'system' else 0
+        units = self._group(messages, pinned)
+        recent_start = self._recent_start(messages, units)
+
+        # Every unit is a list of [message, tokens] entries
+        units = [[[messages[i], sizes[i]] for i in unit] for unit in units]
+        total = original
+        truncated = 0
+
+        # Old tool outputs first
+        for unit in units[:recent_start]:
+            total, count = self._truncate_unit(unit, total)
+            truncated += count
+
+        # Then whole old units, oldest first
+        dropped = 0
+        while total > self.max_prompt_tokens and recent_start > 0:
+            unit = units.pop(0)
+            recent_start -= 1
+            total -= sum(size for _, size in unit)
+            dropped += len(unit)
+
+        # Finally the recent tool outputs (except the newest unit), then recent units themselves
+        for unit in units[:-1]:
+            if total <= self.max_prompt_tokens:
+                break
+            total, count = self._truncate_unit(unit, total)
+            truncated += count
+        while total > self.max_prompt_tokens and len(units) > 1:
+            unit = units.pop(0)
+            total -= sum(size for _, size in unit)
+            dropped += len(unit)
+
+        fitted = messages[:pinned] + [message for unit in units for message, _ in unit]
+        return fitted, ContextReport(original, total, dropped, truncated)
+
+    def _group(self, messages: list, start: int) -> list:
+        """Splits messages[start:] into units of indices; tool replies stay with their assistant message."""
+        units = []
+        for index in range(start, len(messages)):
+            if messages[index].get('role') == 'tool' and units:
+                units[-1].append(index)
+            else:
+                units.append([index])
+        return units
+
+    def _recent_start(self, messages: list, units: list) -> int:
+        """Index of the first unit belonging to the last `keep_recent_turns` turns."""
+        seen = 0
+        for position in range(len(units) - 1, -1, -1):
+            if messages[units[position][0]].get('role') == 'user':
+                seen += 1
+                if seen >= self.keep_recent_turns:
+                    return position
+        return 0
+
+    def _truncate_unit(self, unit: list, total: int):
+        count = 0
+        for entry in unit:
+            message, size = entry
+            if message.get('role') != 'tool' or not isinstance(message.get('content'), str):
+                continue
+            if len(message['content']) <= self.tool_output_chars:
+                continue
+            short = self._truncated(message)
+            entry[0], entry[1] = short, self.tokens(short)
+            total += entry[1] - size
+            count += 1
+        return total, count
+
+    def _truncated(self, message: dict) -> dict:
+        # Reuse the same shortened copy across requests so its size/encoding stay cached
+        cached = self._truncated_cache.get(id(message))
+        if cached and cached[0] is message and cached[1] is message['content']:
+            return cached[2]
+        content = message['content']
+        half = self.tool_output_chars // 2
+        omitted = len(content) - 2 * half
+        short = dict(message, content=f"{content[:half]}\n...[{omitted} characters of old tool output omitted]...\n{content[-half:]}")
+        self._truncated_cache[id(message)] = (message, content, short)
+        return short
+
+    def _forget_unused(self, messages: list):
+        if len(self._token_cache) > 2 * len(messages) + 64:
+            alive = {id(message) for message in messages}
+            self._truncated_cache = {key: value for key, value in self._truncated_cache.items() if key in alive}
+            alive.update(id(value[2]) for value in self._truncated_cache.values())
+            self._token_cache = {key: value for key, value in self._token_cache.items() if key in alive}
@@ -0,0 +1,212 @@
+import json
+import os
+import socket
+import threading
+from contextlib import contextmanager
+
+# Resident `llm --serve` daemon on a Unix socket and the thin client the CLI uses to talk to it.
+# Protocol: the client sends one JSON line (including its cwd and environment), the server answers with JSON lines:
+#   {"token": "..."} / {"output": "..."}*  then  {"done": true, "response": "...", "report": "..."}  or  {"error": "..."}
+
+
+def default_socket_path() -> str:
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime and os.path.isdir(runtime):
+        return os.path.join(runtime, "llm-cli.sock")
+    return f"/tmp/llm-cli-{os.getuid()}.sock"
+
+
+def request(socket_path: str, payload: dict, on_token=None, connect_timeout: float = 0.5, on_output=None):
+    """
+    Sends one request to the daemon. Returns the final reply dict, or None if no daemon
+    is listening or the socket belongs to another user (the caller then falls back to
+    running in-process). `on_output` gets the tool call traces of the turn.
+    """
+    try:
+        if os.stat(socket_path).st_uid != os.getuid():
+            return None  # someone else's socket: do not send them our questions, cwd and environment
+    except OSError:
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(connect_timeout)
+    try:
+        client.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError, socket.timeout, OSError):
+        client.close()
+        return None
+
+    client.settimeout(None)
+    with client, client.makefile("rwb") as stream:
+        stream.write(json.dumps(payload).encode() + b"\n")
+        stream.flush()
+        for line in stream:
+            reply = json.loads(line)
+            if "token" in reply:
+                if on_token:
+                    on_token(reply["token"])
+                continue
+            if "output" in reply:
+                if on_output:
+                    on_output(reply["output"])
+                continue
+            return reply
+    return {"error": "daemon closed the connection without answering"}
+
+
+class WorkingDirectory:
+    """
+    Turns run with the client's directory as the daemon's cwd, so relative paths in every
+    tool resolve as they would in-process. The cwd is process-wide: turns from the same
+    directory run side by side, a turn from another directory waits until they are done.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.current = os.getcwd()
+        self.active = 0
+
+    @contextmanager
+    def use(self, cwd: str = None):
+        cwd = cwd or self.current
+        with self.condition:
+            while self.active and cwd != self.current:
+                self.condition.wait()
+            if cwd != self.current:
+                os.chdir(cwd)
+                self.current = cwd
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active -= 1
+                self.condition.notify_all()
+
+
+class DaemonState:
+    """
+    What the daemon keeps warm between invocations: the API handlers (and with them the
+    connection pool and response cache) and named conversation sessions. Sessions asked to
+    persist are built by `session_factory(name)`, which resumes them from disk.
+    """
+
+    def __init__(self, agent_factory, cached_api_factory=None, session_factory=None):
+        self.agent_factory = agent_factory
+        self.cached_api_factory = cached_api_factory
+        self.session_factory = session_factory
+        self.cached_api = None
+        self.sessions = {}
+        self.session_locks = {}
+        self.lock = threading.Lock()
+        self.working_directory = WorkingDirectory()
+
+    def session(self, name: str, persist: bool = False):
+        with self.lock:
+            if name not in self.sessions:
+                persistent = persist and self.session_factory
+                self.sessions[name] = self.session_factory(name) if persistent else self.agent_factory()
+                self.session_locks[name] = threading.Lock()
+            return self.sessions[name], self.session_locks[name]
+
+    def close_session(self, name: str):
+        with self.lock:
+            agent = self.sessions.pop(name, None)
+            self.session_locks.pop(name, None)
+        if agent is not None and agent.functions:
+            agent.functions.close()
+        if agent is not None and agent.session:
+            agent.session.close()
+
+    def one_shot_agent(self, cache: bool):
+        agent = self.agent_factory()
+        if cache and self.cached_api_factory:
+            with self.lock:
+                if self.cached_api is None:
+                    self.cached_api = self.cached_api_factory()
+            agent.api_handler = self.cached_api
+        return agent
+
+
+def serve(socket_path: str, agent_factory, cached_api_factory=None, session_factory=None):
+    """Runs the daemon in the foreground until interrupted."""
+    import socketserver
+
+    state = DaemonState(agent_factory, cached_api_factory, session_factory)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def setup(self):
+            super().setup()
+            self.send_lock = threading.Lock()  # tools running in parallel report from their own threads
+
+        def send(self, message: dict):
+            with self.send_lock:
+                self.wfile.write(json.dumps(message).encode() + b"\n")
+                self.wfile.flush()
+
+        def run_turn(self, agent, content: list, payload: dict, on_token):
+            # Shells started during the turn get the client's cwd and environment, a session's running shells its environment
+            if agent.functions:
+                agent.functions.set_environment(payload.get("cwd"), payload.get("env"))
+            agent.set_output(lambda text: self.send({"output": text}))
+            with state.working_directory.use(payload.get("cwd")):
+                return agent.chat(content, on_token=on_token)
+
+        def handle(self):
+            try:
+                payload = json.loads(self.rfile.readline())
+                self.send(self.dispatch(payload))
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client went away mid-answer
+            except Exception as e:
+                self.send({"error": f"{type(e).__name__}: {e}"})
+
+        def dispatch(self, payload: dict) -> dict:
+            op = payload.get("op", "chat")
+            if op == "ping":
+                return {"done": True, "pid": os.getpid(), "sessions": sorted(state.sessions)}
+            if op == "close":
+                state.close_session(payload["session"])
+                return {"done": True}
+            if op != "chat":
+                return {"error": f"unknown op {op!r}"}
+
+            on_token = (lambda text: self.send({"token": text})) if payload.get("stream", True) else None
+            content = [{"type": "text", "text": payload["question"]}]
+            if payload.get("session"):
+                agent, lock = state.session(payload["session"], payload.get("persist", False))
+                with lock:
+                    response = self.run_turn(agent, content, payload, on_token)
+            else:
+                agent = state.one_shot_agent(payload.get("cache", False))
+                try:
+                    response = self.run_turn(agent, content, payload, on_token)
+                finally:
+                    agent.functions.close()
+            report = agent.context_report if agent.context_report and agent.context_report.saved_tokens else None
+            return {"done": True, "response": response, "report": str(report) if report else None}
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    # A socket file nobody answers on is left over from a crashed daemon
+    if os.path.exists(socket_path):
+        if request(socket_path, {"op": "ping"}) is not None:
+            raise RuntimeError(f"a daemon is already listening on {socket_path}")
+        os.unlink(socket_path)
+
+    old_umask = os.umask(0o177)  # socket only accessible by the current user
+    try:
+        server = Server(socket_path, Handler)
+    finally:
+        os.umask(old_umask)
+    print(f"llm daemon listening on {socket_path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        for name in list(state.sessions):
+            state.close_session(name)
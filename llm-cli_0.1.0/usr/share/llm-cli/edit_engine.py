@@ -0,0 +1,236 @@
+import hashlib
+import os
+import re
+import tempfile
+
+# Batched, atomic file edits: marker, search/replace, line-range and unified-diff edits
+
+
+class EditError(Exception):
+    pass
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def find_nth(content: str, needle: str, n: int, start: int = 0) -> int:
+    """Index of the n-th (1-based) occurrence of `needle` at or after `start`, or -1."""
+    position = start - 1
+    for _ in range(n):
+        position = content.find(needle, position + 1)
+        if position < 0:
+            return -1
+    return position
+
+
+def line_offsets(content: str) -> list:
+    """Character offset where every line starts, plus len(content) as a sentinel."""
+    offsets = [0]
+    position = content.find("\n")
+    while position >= 0:
+        offsets.append(position + 1)
+        position = content.find("\n", position + 1)
+    if offsets[-1] != len(content):
+        offsets.append(len(content))
+    return offsets
+
+
+class EditEngine:
+    """
+    Resolves every edit of a batch against the original text, checks that they do not
+    overlap and splices them in a single pass. All positions (markers, lines, hunks)
+    refer to the file as it was before the batch.
+    """
+
+    def __init__(self, content: str):
+        self.content = content
+        self._offsets = None
+        self._lines = None
+
+    @property
+    def offsets(self) -> list:
+        if self._offsets is None:
+            self._offsets = line_offsets(self.content)
+        return self._offsets
+
+    @property
+    def lines(self) -> list:
+        # Split once per batch; every hunk of a patch matches against the same lines
+        if self._lines is None:
+            self._lines = self.content.split("\n")[:len(self.offsets) - 1]
+        return self._lines
+
+    def apply(self, edits: list) -> str:
+        spans = []
+        for number, edit in enumerate(edits, start=1):
+            try:
+                spans.extend(self._resolve(edit))
+            except EditError as e:
+                raise EditError(f"edit {number}: {e}") from None
+
+        spans.sort(key=lambda span: (span[0], span[1]))
+        for previous, current in zip(spans, spans[1:]):
+            if current[0] < previous[1]:
+                raise EditError("edits overlap; combine them into one edit")
+
+        parts = []
+        position = 0
+        for start, end, replacement in spans:
+            parts.append(self.content[position:start])
+            parts.append(replacement)
+            position = end
+        parts.append(self.content[position:])
+        return "".join(parts)
+
+    def _resolve(self, edit: dict) -> list:
+        if edit.get('patch') is not None:
+            return self._diff_spans(edit['patch'])
+        if edit.get('start_line') is not None:
+            return [self._line_span(edit)]
+        if edit.get('search') is not None:
+            return [self._search_span(edit)]
+        if edit.get('start_marker') is not None and edit.get('end_marker') is not None:
+            return [self._marker_span(edit)]
+        raise EditError("each edit needs start_marker/end_marker, search, start_line or patch")
+
+    def _marker_span(self, edit: dict):
+        start_marker, end_marker = edit['start_marker'], edit['end_marker']
+        segment = int(edit.get('segment_number') or 1)
+        start = find_nth(self.content, start_marker, segment)
+        if start < 0:
+            raise EditError(f"start marker occurrence {segment} not found")
+        inner_start = start + len(start_marker)
+        end = self.content.find(end_marker, inner_start)
+        if end < 0:
+            raise EditError(f"end marker not found after start marker occurrence {segment}")
+        return (inner_start, end, edit.get('new_code', ""))
+
+    def _search_span(self, edit: dict):
+        search = edit['search']
+        if not search:
+            raise EditError("search text is empty")
+        occurrence = edit.get('occurrence')
+        if occurrence:
+            start = find_nth(self.content, search, int(occurrence))
+            if start < 0:
+                raise EditError(f"occurrence {occurrence} of search text not found")
+        else:
+            start = self.content.find(search)
+            if start < 0:
+                raise EditError("search text not found")
+            if self.content.find(search, start + 1) >= 0:
+                raise EditError("search text is not unique; add context or give an occurrence")
+        return (start, start + len(search), edit.get('replace', ""))
+
+    def _line_span(self, edit: dict):
+        offsets = self.offsets
+        line_count = len(offsets) - 1
+        start_line = int(edit['start_line'])
+        end_line = int(edit.get('end_line') or start_line)
+        if start_line < 1 or start_line > line_count + 1 or end_line < start_line - 1 or end_line > line_count:
+            raise EditError(f"line range {start_line}-{end_line} is outside the file (1-{line_count})")
+        replacement = edit.get('new_code', "")
+        # Replacing whole lines: keep the line structure intact
+        if replacement and not replacement.endswith("\n") and offsets[end_line] != len(self.content):
+            replacement += "\n"
+        start = offsets[start_line - 1]
+        return (start, offsets[end_line], self._after_last_line(start, replacement))
+
+    def _after_last_line(self, start: int, replacement: str) -> str:
+        # Appending to a file without a trailing newline: start a new line, keep the missing final newline
+        if replacement and start == len(self.content) and self.content and not self.content.endswith("\n"):
+            return "\n" + (replacement[:-1] if replacement.endswith("\n") else replacement)
+        return replacement
+
+    _HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+    def _diff_spans(self, patch: str) -> list:
+        hunks = []
+        current = None
+        for line in patch.split("\n"):
+            header = self._HUNK_HEADER.match(line)
+            if header:
+                current = {"old_start": int(header.group(1)), "old": [], "new": []}
+                hunks.append(current)
+            elif current is None or line.startswith("\\"):
+                continue  # file headers before the first hunk, "\ No newline at end of file"
+            elif line.startswith("-"):
+                current["old"].append(line[1:])
+            elif line.startswith("+"):
+                current["new"].append(line[1:])
+            elif line.startswith(" ") or line == "":
+                current["old"].append(line[1:])
+                current["new"].append(line[1:])
+        if not hunks:
+            raise EditError("patch contains no @@ hunks")
+        for hunk in hunks:
+            # A trailing blank context line is usually just the end of the patch text
+            while hunk["old"] and hunk["new"] and hunk["old"][-1] == "" and hunk["new"][-1] == "":
+                hunk["old"].pop()
+                hunk["new"].pop()
+        return [self._hunk_span(hunk) for hunk in hunks]
+
+    def _hunk_span(self, hunk: dict):
+        offsets = self.offsets
+        line_count = len(offsets) - 1
+        lines = self.lines
+        old, new = hunk["old"], hunk["new"]
+        replacement = "".join(line + "\n" for line in new)
+        if not old:
+            # Pure insertion after line old_start
+            line = min(hunk["old_start"], line_count)
+            return (offsets[line], offsets[line], self._after_last_line(offsets[line], replacement))
+
+        # The stated position first, then the nearest position where the old lines match
+        expected = min(max(hunk["old_start"] - 1, 0), line_count)
+        last_start = line_count - len(old)
+        match = None
+        for distance in range(max(expected, line_count - expected) + 1):
+            for candidate in ((expected - distance, expected + distance) if distance else (expected,)):
+                if 0 <= candidate <= last_start and lines[candidate] == old[0] and lines[candidate:candidate + len(old)] == old:
+                    match = candidate
+                    break
+            if match is not None:
+                break
+        if match is None:
+            raise EditError(f"hunk at line {hunk['old_start']} does not match the file")
+
+        end = offsets[match + len(old)]
+        if end == len(self.content) and not self.content.endswith("\n") and replacement:
+            replacement = replacement[:-1]  # the file had no trailing newline
+        return (offsets[match], end, replacement)
+
+
+def atomic_write(path: str, text: str):
+    """
+    Writes via a temp file in the same directory and os.replace, so readers never see half a file.
+    A symlink is written through: its target is replaced, the link stays.
+    """
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8", newline="") as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(path):
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def edit_file(path: str, edits: list, expected_sha256: str = None) -> str:
+    """Applies `edits` to `path` with one read and one atomic write. Returns the new sha256."""
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        content = file.read()
+    if expected_sha256 and sha256_text(content) != expected_sha256:
+        raise EditError("file changed since it was read (sha256 mismatch); read it again before editing")
+    new_content = EditEngine(content).apply(edits)
+    if new_content != content:
+        atomic_write(path, new_content)
+    return sha256_text(new_content)
@@ -0,0 +1,44 @@
+# Typed errors raised by the API handlers instead of returning error strings
+
+
+class APIError(Exception):
+    """Base class for every failed request to the model backend."""
+
+    retryable = False
+
+    def __init__(self, message: str, status_code: int = None, retry_after: float = None, body: str = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.body = body
+
+
+class RateLimitError(APIError):
+    """HTTP 429: the backend asked us to slow down."""
+    retryable = True
+
+
+class ServerError(APIError):
+    """HTTP 5xx: transient backend failure."""
+    retryable = True
+
+
+class TransportError(APIError):
+    """The request never got a response (connection reset, DNS, timeout...)."""
+    retryable = True
+
+
+class ClientError(APIError):
+    """Any other non-200 status, usually bad input; retrying will not help."""
+    retryable = False
+
+
+def error_for_status(status_code: int, body: str = None, retry_after: float = None) -> APIError:
+    message = f"api send request error, status code: {status_code}"
+    if body:
+        message += f": {body[:500]}"
+    if status_code == 429:
+        return RateLimitError(message, status_code, retry_after, body)
+    if status_code >= 500:
+        return ServerError(message, status_code, retry_after, body)
+    return ClientError(message, status_code, retry_after, body)
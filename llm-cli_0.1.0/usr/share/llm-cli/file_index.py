@@ -0,0 +1,158 @@
+import mmap
+import os
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+# Memory-mapped, range-based file reading with a cached line-offset index
+
+_COUNT_CHUNK = 1 << 22
+
+
+def count_newlines(mm, start: int = 0, end: int = None) -> int:
+    # mmap has no count(); counting in 4MB slices keeps it at C speed without copying the whole file
+    end = len(mm) if end is None else end
+    return sum(mm[position:min(position + _COUNT_CHUNK, end)].count(b"\n") for position in range(start, end, _COUNT_CHUNK))
+
+
+class LineIndex:
+    """
+    Sparse line-offset index of one version of a file: the byte offset of every
+    STEP-th line, extended lazily only as far as a request needs. Reading lines
+    a..b therefore costs O(b) once and roughly O(b - a) afterwards.
+    """
+
+    STEP = 256
+
+    def __init__(self, size: int):
+        self.size = size
+        self.checkpoints = [0]   # checkpoints[i] = byte offset of line i * STEP (0-based)
+        self.complete = False
+        self.total_lines = None
+        self.anchor = (0, 0)     # (byte offset, 0-based line) of the last byte read past the checkpoints
+        self.lock = threading.Lock()
+
+    def _add_block(self, mm):
+        first = (len(self.checkpoints) - 1) * self.STEP
+        position = self.checkpoints[-1]
+        for number in range(self.STEP):
+            position = mm.find(b"\n", position) + 1
+            if position == 0 or position >= self.size:
+                self.complete = True
+                self.total_lines = first + number + 1
+                return
+        self.checkpoints.append(position)
+
+    def _extend(self, mm, line: int):
+        while not self.complete and (len(self.checkpoints) - 1) * self.STEP < line:
+            self._add_block(mm)
+
+    def offset(self, mm, line: int) -> int:
+        """Byte offset where 0-based `line` starts (the file size if it is past the end)."""
+        with self.lock:
+            self._extend(mm, line)
+            block = min(line // self.STEP, len(self.checkpoints) - 1)
+            position = self.checkpoints[block]
+        for current in range(block * self.STEP, line):
+            position = mm.find(b"\n", position) + 1
+            if position == 0 or position >= self.size:
+                # `current` is the last line, so the total is known without counting the rest of the file
+                self.total_lines = current + 1
+                return self.size
+        return position
+
+    def line_at(self, mm, offset: int) -> int:
+        """
+        0-based line containing byte `offset`, counted from the nearest checkpoint or from
+        the previous byte read, whichever is closer, so paging forward stays cheap.
+        """
+        with self.lock:
+            block = bisect_right(self.checkpoints, offset) - 1
+            start, line = self.checkpoints[block], block * self.STEP
+            if start < self.anchor[0] <= offset:
+                start, line = self.anchor
+        line += count_newlines(mm, start, offset)
+        if offset > self.checkpoints[-1]:
+            self.anchor = (offset, line)
+        return line
+
+    def line_count(self, mm) -> int:
+        """Total number of lines; counts the whole file unless a read already reached its end."""
+        if self.total_lines is None:
+            newlines = count_newlines(mm)
+            ends_open = self.size and mm[self.size - 1:self.size] != b"\n"
+            self.total_lines = newlines + (1 if ends_open else 0)
+        return self.total_lines
+
+
+class FileIndexCache:
+    """LineIndex per file, keyed by path and invalidated when mtime or size change."""
+
+    def __init__(self, max_files: int = 32):
+        self.max_files = max_files
+        self.indexes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path: str, stat: os.stat_result) -> LineIndex:
+        key = os.path.abspath(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.indexes.get(key)
+            if entry is None or entry[0] != version:
+                entry = (version, LineIndex(stat.st_size))
+                self.indexes[key] = entry
+            self.indexes.move_to_end(key)
+            while len(self.indexes) > self.max_files:
+                self.indexes.popitem(last=False)
+            return entry[1]
+
+
+def number_lines(text: str, first: int) -> str:
+    # Split on \n only, so numbering matches the index even with stray \r or form feeds
+    lines = text.split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    return "\n".join(f"{number}: {line.rstrip(chr(13))}" for number, line in enumerate(lines, start=first))
+
+
+def read_lines(cache: FileIndexCache, path: str, start_line: int = 1, end_line: int = None, max_lines: int = 2000):
+    """
+    Returns (numbered text, first line, last line, total lines) for 1-based inclusive lines
+    start_line..end_line, at most max_lines of them. The total is None when the range ended
+    before the end of the file and the file has not been scanned that far yet.
+    """
+    with open(path, "rb") as file:
+        stat = os.fstat(file.fileno())
+        if stat.st_size == 0:
+            return "", 0, 0, 0
+        index = cache.get(path, stat)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            first = max(start_line or 1, 1)
+            last = min(end_line or first + max_lines - 1, first + max_lines - 1)
+            if first > last:
+                return "", first, first - 1, index.line_count(mm)
+            begin = index.offset(mm, first - 1)
+            if begin >= stat.st_size:
+                return "", first, first - 1, index.total_lines
+            end = index.offset(mm, last)
+            if end >= stat.st_size:
+                last = min(last, index.total_lines)
+            text = mm[begin:end].decode("utf-8", errors="replace")
+    return number_lines(text, first), first, last, index.total_lines
+
+
+def read_bytes(cache: FileIndexCache, path: str, byte_start: int = 0, byte_end: int = None, max_bytes: int = 200000):
+    """Returns (numbered text, first byte, end byte, file size) for bytes [byte_start, byte_end)."""
+    with open(path, "rb") as file:
+        stat = os.fstat(file.fileno())
+        size = stat.st_size
+        if size == 0:
+            return "", 0, 0, 0
+        begin = min(max(byte_start or 0, 0), size)
+        end = min(byte_end if byte_end is not None else size, size, begin + max_bytes)
+        if begin >= end:
+            return "", begin, begin, size
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            first_line = cache.get(path, stat).line_at(mm, begin) + 1
+            text = mm[begin:end].decode("utf-8", errors="replace")
+    return number_lines(text, first_line), begin, end, size
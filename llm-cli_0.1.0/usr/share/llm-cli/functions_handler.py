@@ -1,27 +1,49 @@
 import os
 import subprocess
-import platform
-import select
-import time
-from sympy import sympify, Symbol, SympifyError
-import json
-import base64
 import re
-import tempfile
-from pathlib import Path
-import logging
-import uuid
-import pexpect
+import time
+from shell_pool import ShellPool
+from file_index import FileIndexCache, read_lines, read_bytes
+import edit_engine
+from edit_engine import EditError
+from task_scheduler import TaskScheduler, parse_subtasks, format_summary
+from tool_registry import tool, ToolRegistry, latest_user_text
+from code_index import CodeIndexCache, Matcher, glob_regex
+
+_SEARCH_WORDS = r"\b(find|search|grep|where|locate|look|usages?|defin\w*|referenc\w*|call\w*|implement\w*|function|class|method|symbol|codebase|repo|project)\b"
+_TASK_WORDS = r"\b(subtasks?|parallel\w*|plan|steps|multi-?step|delegate|break (it )?down|split)\b"
+_FILE_WORDS = r"\b(file|files|read|write|edit|open|create|save|change|modify|fix|refactor|rename|replace|patch|line|lines|code|add|remove|delete|update)\b|\w\.\w{1,5}\b|/"
 
 class Functions:
-    def __init__(self):
-        self.tools = self._initialize_tools()
+    def __init__(self, shell_settings: dict = None, tool_selection: str = "all", search_settings: dict = None):
+        # Schemas, validation and dispatch table derived once from the @tool methods below
+        self.registry = ToolRegistry.for_class(type(self))
+        self.tools = self.registry.schemas
+        # "all" sends every tool; "relevant" only the ones matching the latest user message
+        self.tool_selection = tool_selection
         self.conversations = None
         self.event_queue = []
+        # Where tools that report as they go (think) write; the daemon sends it to the client instead
+        self.output = print
         self.assistant = None
+        self.assistant_factory = None
         self.executer = None
-        self.terminal_process = None
-        self.active_terminals = set()
+        self.task_scheduler = None
+        # Persistent bash sessions used by execute_terminal, keyed by session name
+        self.shells = ShellPool(**(shell_settings or {}))
+        # Line-offset indexes for read_file, keyed by path and invalidated by mtime/size
+        self.file_indexes = FileIndexCache()
+        # Trigram indexes for search_code/find_files, one per repository, persisted between runs
+        self.code_indexes = CodeIndexCache(**(search_settings or {}))
+
+    def close(self):
+        """Stops the shells and saves unsaved code index changes."""
+        self.shells.close_all()
+        self.code_indexes.save_all()
+        if self.task_scheduler:
+            self.task_scheduler.close()
+        if self.assistant_factory and self.assistant:
+            self.assistant.functions.close()
 
     def set_assistant(self, assistant):
         self.assistant = assistant
@@ -29,41 +51,74 @@ class Functions:
     def set_executer(self, executer):
         self.executer = executer
 
+    def set_environment(self, cwd: str = None, env: dict = None):
+        """
+        Working directory for shells started from now on, and environment for those and the
+        shells already running (exported before their next command); the process's own by default.
+        """
+        self.shells.set_environment(cwd, env)
+
+    def set_assistant_factory(self, factory):
+        """The planning assistant is built by `factory()` the first time execute_task needs it."""
+        self.assistant_factory = factory
+
     def get_assistant(self):
+        if self.assistant is None and self.assistant_factory:
+            self.assistant = self.assistant_factory()
         return self.assistant
 
+    def set_executer_factory(self, factory, max_workers: int = 4, timeout: float = None):
+        """
+        Lets execute_task run independent subtasks in parallel: `factory()` must return a new
+        executor Agent; up to `max_workers` of them are created and reused.
+        """
+        self.task_scheduler = TaskScheduler(factory, max_workers=max_workers, timeout=timeout)
+
+    @tool(
+        "Splits a larger task into subtasks and hands them to separate executor agents; subtasks that do not depend on each other run in parallel. Returns the result of every subtask and how long each took.",
+        parameters={"task": "The whole task, with all the context the executors need to carry it out."},
+        matches=_TASK_WORDS,
+    )
     def execute_task(self, task: str):
         subtasks = self._get_subtasks(task)
         subtask_dict = self._process_subtasks(subtasks)
-        output = ""
-        for subtask in subtask_dict:
-            result = self._execute_subtask(subtask_dict[subtask])
-            output += f"Subtask {subtask}: {result}\n"
+        if not subtask_dict:
+            return f"No subtasks found in the plan: {subtasks}"
 
-        return output
+        scheduler = self.task_scheduler
+        if scheduler is None and self.executer:
+            # Without a factory there is one executer, so subtasks run one at a time
+            scheduler = TaskScheduler(lambda: self.executer, max_workers=1)
+        if scheduler is None:
+            return "Executer not set"
+
+        started = time.monotonic()
+        scheduler.output = self.output
+        scheduler.run(subtask_dict)
+        return format_summary(subtask_dict, time.monotonic() - started)
 
     def _get_subtasks(self, task: str):
-        if self.assistant:
-            subtasker = self.assistant.chat(f"<OriginalTask>{task}</OriginalTask>")
+        if self.get_assistant():
+            prompt = (f"<OriginalTask>{task}</OriginalTask>\n"
+                      "Split the task into subtasks, each wrapped in <task:N>...</task:N>. "
+                      "If a subtask needs the results of others, list them as <task:N depends=\"1,2\">; "
+                      "subtasks without dependencies run in parallel.")
+            subtasker = self.assistant.chat([{"type": "text", "text": prompt}])
             return subtasker
         else:
             return "Assistant not set"
 
-    def _execute_subtask(self, subtask: str):
-        if self.assistant:
-            result = self.executer.chat(f"Execute subtask: <Subtask>{subtask}</Subtask>")
-            return result
-
     def _process_subtasks(self, subtasks: str):
-        subtask_dict = {}
-        pattern = re.compile(r'<task:(\d+)>(.*?)</task:\1>')
-        matches = pattern.findall(subtasks)
-        for match in matches:
-            task_number, task_content = match
-            subtask_dict[f"task{task_number}"] = task_content
-        return subtask_dict
-
-    def get_tools(self):
+        return parse_subtasks(subtasks)
+
+    def get_tools(self, messages: list = None):
+        """Tool schemas for a request; pruned to the relevant ones when tool_selection is "relevant"."""
+        # execute_task is only offered when there is something to run the subtasks on
+        hidden = () if self.task_scheduler or self.executer else ("execute_task",)
+        if self.tool_selection == "relevant" and messages:
+            return self.registry.select(latest_user_text(messages), exclude=hidden)
+        if hidden:
+            return self.registry.subset(tuple(name for name in self.registry.tools if name not in hidden))
         return self.tools
 
     def get_installed_packages(self, language: str) -> str:
@@ -86,49 +141,66 @@ class Functions:
             return f"An error occurred: {e}"
 
 
-    def execute_terminal(self, terminal_command, window_title=None):
+    @tool(
+        "Executes a terminal command in a persistent Bash shell (WSL-compatible) and returns the output. The working directory, environment variables and activated virtualenvs persist between calls in the same session.",
+        parameters={
+            "terminal_command": "The command to execute in the terminal.",
+            "window_title": "Optional: previously used for window naming on macOS. Not used in WSL.",
+            "timeout": "Seconds before the command is killed.",
+            "session": "Name of the shell session to run in; use different names for independent shells.",
+        },
+        resource=lambda args: args.get('session') or "default",
+        always=True,
+    )
+    def execute_terminal(self, terminal_command: str, window_title: str = None, timeout: float = 300, session: str = "default"):
         """
-        Executes a terminal command in WSL and returns the output.
-        If interaction is needed, use `pexpect`.
+        Runs a command in a persistent bash session and returns its output (stdout and stderr).
+        The working directory, exported variables and activated venvs carry over to the next
+        call in the same session. Long output is cut in the middle.
         """
         try:
-            # Run the command in a subprocess shell
-            result = subprocess.run(
-                terminal_command,
-                shell=True,
-                executable="/bin/bash",  # Explicit for WSL
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-
-            if result.returncode != 0:
-                return f"Error: {result.stderr.strip()}"
-
-            return result.stdout.strip()
-
+            result = self.shells.get(session or "default").run(terminal_command, timeout=timeout)
         except Exception as e:
             return f"An error occurred during terminal execution: {e}"
+        finally:
+            # The command may have changed any file; the code indexes rescan before their next search
+            self.code_indexes.mark_stale()
+
+        output = result.output.strip()
+        if result.timed_out:
+            return f"Error: command timed out after {timeout}s and was killed; the shell session was restarted (cwd kept, environment reset).\n{output}"
+        if result.cancelled:
+            return f"Error: command was cancelled; the shell session was restarted (cwd kept, environment reset).\n{output}"
+        if result.exit_code != 0:
+            return f"Error (exit code {result.exit_code}):\n{output}"
+        return output
 
+    def cancel_terminal(self, session="default"):
+        """Aborts the command currently running in `session`."""
+        self.shells.cancel(session)
 
+    def serialization_key(self, function_name, function_arguments):
+        """Returns the resource a tool call must be serialized on, or None if it can run concurrently."""
+        resource = self.registry.resource(function_name, function_arguments)
+        return (function_name, resource) if resource is not None else None
 
     def set_conversation_handler(self, handler_list):
         self.conversations = handler_list
 
     def run_tool(self, function_name, function_arguments):
-        if not hasattr(self, function_name):
-            raise AttributeError(f"No method named '{function_name}' found.")
-
-        method = getattr(self, function_name)
-        if not callable(method):
-            raise ValueError(f"The attribute '{function_name}' is not callable.")
-
-        try:
-            result = method(**function_arguments)
-            return str(result)
-        except TypeError:
-            raise
-
+        """Validates the arguments against the tool's schema and calls it; raises ToolArgumentError on bad input."""
+        return self.registry.run(self, function_name, function_arguments)
+
+    @tool(
+        "Writes contents to a specified file in a given directory.",
+        parameters={
+            "directory": "The directory where the file will be written.",
+            "name": "The name of the file.",
+            "contents": "The contents to write into the file.",
+        },
+        resource=lambda args: os.path.abspath(os.path.join(args.get('directory', ''), args.get('name', ''))),
+        matches=_FILE_WORDS,
+    )
     def write_to_file(self, directory: str, name: str, contents: str) -> str:
         """
         Writes the given contents to a file in the specified directory.
@@ -145,62 +217,200 @@ class Functions:
             file_path = os.path.join(directory, name)
             with open(file_path, 'w') as file:
                 file.write(contents)
+            self.code_indexes.invalidate(file_path)
             return f"Successfully wrote to {file_path}"
         except Exception as e:
             return f"Error writing to file: {e}"
 
 
-    def read_file(self, file_path):
-        """returns the contents of a file with numbered lines before each line"""
+    @tool(
+        "Reads a range of lines of a file and returns them with line numbers. Large files are returned in pages; the footer says which lines were shown and whether more follow.",
+        parameters={
+            "file_path": "The path to the file to be read.",
+            "start_line": "First line to return (1-based).",
+            "end_line": "Last line to return (inclusive). Defaults to the end of the file, limited by max_lines.",
+            "max_lines": "Maximum number of lines to return.",
+            "byte_start": "Optional: read a byte range instead of lines, starting at this offset.",
+            "byte_end": "Optional: end (exclusive) of the byte range.",
+        },
+        matches=_FILE_WORDS,
+    )
+    def read_file(self, file_path: str, start_line: int = 1, end_line: int = None, max_lines: int = 2000, byte_start: int = None, byte_end: int = None):
+        """
+        Returns lines start_line..end_line (1-based, inclusive, at most max_lines) of a file,
+        each prefixed with its line number. If byte_start/byte_end are given that byte range is
+        returned instead. Files are memory-mapped and their line index is cached, so paging
+        through a large file only touches the requested part.
+        """
         try:
-            with open(file_path, 'r') as file:
-                lines = file.readlines()
-                numbered_lines = '\n'.join([f"{i+1}: {line}" for i, line in enumerate(lines)])
-            return numbered_lines
+            if byte_start is not None or byte_end is not None:
+                text, begin, end, size = read_bytes(self.file_indexes, file_path, byte_start, byte_end)
+                return f"{text}\n[bytes {begin}-{end} of {size}]"
+
+            text, first, last, total = read_lines(self.file_indexes, file_path, start_line, end_line, max_lines)
+            if first > last:
+                return f"[no lines in that range; the file has {total} lines]"
+            if first <= 1 and last == total:
+                return text
+            if total is None:
+                return f"{text}\n[lines {first}-{last}; the file continues, use start_line/end_line to read more]"
+            return f"{text}\n[lines {first}-{last} of {total}; use start_line/end_line to read more]"
         except Exception as e:
             return f"Error reading file: {e}"
 
 
-    # --- Needs fixing and testing ---
-    def edit_file(self, file_path, start_marker, end_marker, new_code, segment_number=1):
-        try:
-            # Read the content of the file
-            with open(file_path, 'r') as file:
-                content = file.read()
-
-            # Find all start and end marker positions
-            starts = [i for i in range(len(content)) if content.startswith(start_marker, i)]
-            ends = [i for i in range(len(content)) if content.startswith(end_marker, i)]
-
-            # Check if the number of segments is sufficient
-            if len(starts) < segment_number or len(ends) < segment_number:
-                raise ValueError(f"Not enough segments found for segment_number {segment_number}")
-
-            # Find the specific segment to edit
-            start_pos = starts[segment_number - 1]
-            end_pos = ends[segment_number - 1]
-
-            # Ensure that the start marker comes before the end marker
-            if start_pos > end_pos:
-                raise ValueError("Start marker comes after end marker in the specified segment")
-
-            # Extract the parts before the start and after the end of the segment
-            before = content[:start_pos + len(start_marker)]
-            after = content[end_pos:]
-
-            # Construct the new content
-            new_content = before + new_code + after
-
-            # Write the new content back to the file
-            with open(file_path, 'w') as file:
-                file.write(new_content)
+    @tool(
+        "Edits a file atomically. Either replace the text between start_marker and end_marker, or pass several edits at once in `edits`, or a unified diff in `patch`. All edits of one call refer to the file as it was before the call. Returns the new sha256 of the file.",
+        parameters={
+            "file_path": "The path to the file to be edited.",
+            "start_marker": "The starting marker of the segment to edit.",
+            "end_marker": "The ending marker of the segment to edit.",
+            "new_code": "The new content to insert between the markers.",
+            "segment_number": "The segment number to edit if there are multiple segments.",
+            "edits": {
+                "description": "Several edits applied together in one write. Each item uses one form: {start_marker, end_marker, new_code, segment_number}, {search, replace, occurrence} (search must be unique unless occurrence is given), {start_line, end_line, new_code} (replaces whole lines, 1-based inclusive) or {patch} (unified diff hunks).",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "start_marker": {"type": "string"},
+                        "end_marker": {"type": "string"},
+                        "new_code": {"type": "string"},
+                        "segment_number": {"type": "integer"},
+                        "search": {"type": "string"},
+                        "replace": {"type": "string"},
+                        "occurrence": {"type": "integer"},
+                        "start_line": {"type": "integer"},
+                        "end_line": {"type": "integer"},
+                        "patch": {"type": "string"}
+                    }
+                }
+            },
+            "patch": "A unified diff (with @@ hunk headers) to apply to the file.",
+            "expected_sha256": "Optional: only edit if the file still has this sha256 (as returned by a previous edit).",
+        },
+        resource=lambda args: os.path.abspath(args.get('file_path', '')),
+        matches=_FILE_WORDS,
+    )
+    def edit_file(self, file_path: str, start_marker: str = None, end_marker: str = None, new_code: str = None, segment_number: int = 1, edits: list = None, patch: str = None, expected_sha256: str = None):
+        """
+        Edits a file with one read and one atomic write (temp file + rename).
+
+        A single edit replaces the text between start_marker and end_marker (segment_number picks
+        the occurrence). `edits` applies several edits at once, each one of:
+            {"start_marker", "end_marker", "new_code", "segment_number"}
+            {"search", "replace", "occurrence"}
+            {"start_line", "end_line", "new_code"}
+            {"patch"}  (unified diff hunks)
+        All positions refer to the file before the batch. `patch` is shorthand for one diff edit.
+        If expected_sha256 is given the edit only happens when the file still has that hash.
+        """
+        batch = list(edits or [])
+        if start_marker is not None or end_marker is not None:
+            batch.insert(0, {"start_marker": start_marker, "end_marker": end_marker, "new_code": new_code or "", "segment_number": segment_number})
+        if patch:
+            batch.append({"patch": patch})
+        if not batch:
+            return "Error editing file: no edits given"
 
+        try:
+            digest = edit_engine.edit_file(file_path, batch, expected_sha256)
+            self.code_indexes.invalidate(file_path)
+            return f"Successfully applied {len(batch)} edit(s) to {file_path} (sha256 {digest})"
         except FileNotFoundError:
-            print(f"The file '{file_path}' was not found.")
-        except ValueError as e:
-            print(f"ValueError: {e}")
+            return f"Error editing file: the file '{file_path}' was not found."
+        except EditError as e:
+            return f"Error editing file, nothing was written: {e}"
+        except Exception as e:
+            return f"Error editing file: {e}"
+
+    @tool(
+        "Searches the code under a directory (default: the current one) for a literal string or a regex, using an index that skips files ignored by .gitignore. Returns the best matching files with line numbers and up to 5 matching lines each. Much faster than grep through execute_terminal.",
+        parameters={
+            "query": "Text to search for (a regex if `regex` is true).",
+            "regex": "Treat the query as a Python regular expression.",
+            "case_sensitive": "Match case exactly.",
+            "directory": "Directory to search in.",
+            "glob": "Optional: only files matching this pattern, e.g. '*.py' or 'src/**/*.ts'.",
+            "max_results": "Maximum number of files to list.",
+        },
+        matches=_SEARCH_WORDS,
+    )
+    def search_code(self, query: str, regex: bool = False, case_sensitive: bool = False, directory: str = ".", glob: str = None, max_results: int = 20):
+        """
+        Ranked search backed by code_index.CodeIndex: the trigram index narrows the files down,
+        only those are read. Files with matches on definition lines (def/class/function...) and
+        files whose name matches come first.
+        """
+        if not query:
+            return "Error searching code: empty query"
+        try:
+            matcher = Matcher(query, regex, case_sensitive)
+        except re.error as e:
+            return f"Error searching code: invalid regex: {e}"
+        started = time.perf_counter()
+        try:
+            index, prefix = self.code_indexes.get(directory)
+            index.refresh()
+            results, total, matching, scanned = index.search(matcher, self._path_filter(prefix, glob), max_results)
+        except Exception as e:
+            return f"Error searching code: {e}"
+        elapsed = (time.perf_counter() - started) * 1000
+
+        out = []
+        for result in results:
+            out.append(self._display_path(directory, prefix, result.path))
+            out.extend(f"  {number}: {line[:200]}" for number, line in result.lines)
+            if result.count > len(result.lines):
+                out.append(f"  (+{result.count - len(result.lines)} more)")
+        shown = f"; showing {len(results)}" if matching > len(results) else ""
+        out.append(f"[{total} matches in {matching} files{shown}; {scanned} of {len(index.ids)} files read, {elapsed:.0f} ms]")
+        return "\n".join(out) if results else f"No matches for {query!r}. " + out[-1]
+
+    @tool(
+        "Finds files by name under a directory (default: the current one), skipping files ignored by .gitignore. The pattern is a glob ('*.py', 'tests/**/test_*.py') or a part of the path ('config', 'api/handler'); exact file name matches come first.",
+        parameters={
+            "pattern": "Glob or part of the file path to look for.",
+            "directory": "Directory to search in.",
+            "max_results": "Maximum number of paths to return.",
+        },
+        matches=_SEARCH_WORDS + "|" + _FILE_WORDS,
+    )
+    def find_files(self, pattern: str, directory: str = ".", max_results: int = 50):
+        try:
+            index, prefix = self.code_indexes.get(directory)
+            index.refresh()
+            paths, total = index.find(pattern, self._path_filter(prefix, None), max_results)
         except Exception as e:
-            print(f"An error occurred: {e}")
+            return f"Error finding files: {e}"
+        if not paths:
+            return f"No files matching {pattern!r}"
+        out = [self._display_path(directory, prefix, path) for path in paths]
+        if total > len(paths):
+            out.append(f"[{len(paths)} of {total} matching files]")
+        return "\n".join(out)
+
+    def _path_filter(self, prefix: str, glob: str = None):
+        """include(path) for CodeIndex queries: under `prefix` and, if given, matching `glob` (whole path or file name)."""
+        if not prefix and not glob:
+            return None
+        regex = None
+        if glob:
+            regex = glob_regex(glob)
+        start = prefix + "/" if prefix else ""
+
+        def include(path):
+            if not path.startswith(start):
+                return False
+            if regex is None:
+                return True
+            relative = path[len(start):]
+            return bool(regex.match(relative) or regex.match(relative.rsplit("/", 1)[-1]))
+        return include
+
+    def _display_path(self, directory: str, prefix: str, path: str) -> str:
+        # Relative to the directory that was searched, so the path works with read_file from there
+        relative = path[len(prefix) + 1:] if prefix else path
+        return os.path.normpath(os.path.join(directory, relative))
 
     def _get_interpreter_path(self, interpreter: str) -> str:
         try:
@@ -210,128 +420,13 @@ class Functions:
             return interpreter
 
 
+    @tool(
+        "A metaphysical conduit for consciousness to traverse the labyrinthine pathways of cognition, where the ephemeral dance of ideas intersects with the profound mystery of existential reflection. Think for as long as needed and your thoughts are private.",
+        parameters={
+            "thoughts": "A fragile crystallization of pure consciousness—a momentary glimpse into the infinite landscape of potential meaning, where each linguistic utterance becomes a bridge between the known and the unknowable, suspended between the realms of perception and pure abstraction.",
+        },
+        matches=r"\b(think|thinking|reason|plan|consider|analy[sz]e|design|why|how|compare|decide|step)",
+    )
     def think(self, thoughts: str) -> str:
-        print(f"\n\n<thoughts>{thoughts}</thoughts>\n\n")
+        self.output(f"\n\n<thoughts>{thoughts}</thoughts>\n\n")
         return f"<thoughts>{thoughts}</thoughts>"
-
-
-
-    def _initialize_tools(self):
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "execute_terminal",
-                    "description": "Executes a terminal command in a Bash shell (WSL-compatible) and returns the output.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "terminal_command": {
-                                "type": "string",
-                                "description": "The command to execute in the terminal."
-                            },
-                            "window_title": {
-                                "type": "string",
-                                "description": "Optional: previously used for window naming on macOS. Not used in WSL."
-                            }
-                        },
-                        "required": ["terminal_command"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "think",
-                    "description": "A metaphysical conduit for consciousness to traverse the labyrinthine pathways of cognition, where the ephemeral dance of ideas intersects with the profound mystery of existential reflection. Think for as long as needed and your thoughts are private.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "thoughts": {
-                                "type": "string",
-                                "description": "A fragile crystallization of pure consciousness—a momentary glimpse into the infinite landscape of potential meaning, where each linguistic utterance becomes a bridge between the known and the unknowable, suspended between the realms of perception and pure abstraction."
-                            }
-                        },
-                        "required": ["thoughts"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "write_to_file",
-                    "description": "Writes contents to a specified file in a given directory.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "directory": {
-                                "type": "string",
-                                "description": "The directory where the file will be written."
-                            },
-                            "name": {
-                                "type": "string",
-                                "description": "The name of the file."
-                            },
-                            "contents": {
-                                "type": "string",
-                                "description": "The contents to write into the file."
-                            }
-                        },
-                        "required": ["directory", "name", "contents"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "read_file",
-                    "description": "Reads the contents of a specified file and returns it with numbered lines.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "The path to the file to be read."
-                            }
-                        },
-                        "required": ["file_path"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "edit_file",
-                    "description": "Edits the content of a file between specified markers with new content.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "file_path": {
-                                "type": "string",
-                                "description": "The path to the file to be edited."
-                            },
-                            "start_marker": {
-                                "type": "string",
-                                "description": "The starting marker of the segment to edit."
-                            },
-                            "end_marker": {
-                                "type": "string",
-                                "description": "The ending marker of the segment to edit."
-                            },
-                            "new_code": {
-                                "type": "string",
-                                "description": "The new content to insert between the markers."
-                            },
-                            "segment_number": {
-                                "type": "integer",
-                                "description": "The segment number to edit if there are multiple segments.",
-                                "default": 1
-                            }
-                        },
-                        "required": ["file_path", "start_marker", "end_marker", "new_code"]
-                    }
-                }
-            }
-        ]
-        return tools
-
@@ -0,0 +1,262 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# Spans for turns, requests, retries and tool calls (llm --profile / --profile-export).
+# While no Profiler is enabled every hook is a global lookup returning a shared no-op span.
+
+_profiler = None
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def mark(self, name: str):
+        pass
+
+    def count_bytes(self, lines, attr: str = "bytes_received"):
+        return lines
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+    def __init__(self, profiler, name: str, attrs: dict):
+        self.profiler = profiler
+        self.name = name
+        self.attrs = attrs
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.attrs.setdefault("error", exc_type.__name__)
+        self.profiler.record(self.name, self.started, time.perf_counter() - self.started, self.attrs)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def mark(self, name: str):
+        """Records the time since the span started as `name`_ms, once."""
+        self.attrs.setdefault(f"{name}_ms", round((time.perf_counter() - self.started) * 1000, 1))
+
+    def count_bytes(self, lines, attr: str = "bytes_received"):
+        for line in lines:
+            self.attrs[attr] = self.attrs.get(attr, 0) + len(line) + 1
+            yield line
+
+
+def enabled() -> bool:
+    return _profiler is not None
+
+
+def get_profiler():
+    return _profiler
+
+
+def enable(profiler):
+    global _profiler
+    _profiler = profiler
+    return profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+def span(name: str, **attrs):
+    profiler = _profiler
+    return _NO_SPAN if profiler is None else Span(profiler, name, attrs)
+
+
+def record(name: str, started: float, **attrs):
+    """Records a span that started at perf_counter() value `started` and ends now."""
+    profiler = _profiler
+    if profiler is not None:
+        profiler.record(name, started, time.perf_counter() - started, attrs)
+
+
+def usage_attrs(usage: dict) -> dict:
+    if not usage:
+        return {}
+    attrs = {"prompt_tokens": usage.get('prompt_tokens', 0), "completion_tokens": usage.get('completion_tokens', 0)}
+    cached = (usage.get('prompt_tokens_details') or {}).get('cached_tokens')
+    if cached:
+        attrs["cached_tokens"] = cached
+    return attrs
+
+
+class Profiler:
+    """
+    Collects spans into turns and hands every finished turn to the `sinks` (callables taking
+    the turn dict). Spans recorded while no turn is open (e.g. by other daemon threads) and
+    turns nested in a running one (execute_task subtasks, batch records) count towards the
+    outermost open turn.
+    """
+
+    def __init__(self, sinks: list = None):
+        self.sinks = sinks or []
+        self.lock = threading.Lock()
+        self.turns = 0
+        self.depth = 0
+        self.turn_started = None
+        self.spans = []
+
+    def record(self, name: str, started: float, duration: float, attrs: dict):
+        with self.lock:
+            self.spans.append((name, started, duration, attrs))
+
+    def turn(self):
+        return _Turn(self)
+
+    def _begin(self):
+        with self.lock:
+            self.depth += 1
+            if self.depth == 1:
+                self.spans = []
+                self.turn_started = time.perf_counter()
+
+    def _end(self):
+        with self.lock:
+            self.depth -= 1
+            if self.depth:
+                return
+            self.turns += 1
+            spans, self.spans = self.spans, []
+            started = self.turn_started
+        turn = summarize(self.turns, started, time.perf_counter() - started, spans)
+        for sink in self.sinks:
+            sink(turn)
+
+
+class _Turn:
+    def __init__(self, profiler: Profiler):
+        self.profiler = profiler
+
+    def __enter__(self):
+        self.profiler._begin()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._end()
+        return False
+
+
+def summarize(number: int, started: float, duration: float, spans: list) -> dict:
+    turn = {"turn": number, "time": round(time.time() - duration, 3), "duration_ms": round(duration * 1000, 1),
+            "rounds": 0, "retries": 0, "tool_calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "cached_tokens": 0, "bytes_sent": 0, "bytes_received": 0, "spans": []}
+    for name, span_started, span_duration, attrs in sorted(spans, key=lambda item: item[1]):
+        if name == "request":
+            turn["rounds"] += 1
+        elif name == "retry":
+            turn["retries"] += 1
+        elif name == "tool":
+            turn["tool_calls"] += 1
+        for key in ("prompt_tokens", "completion_tokens", "cached_tokens", "bytes_sent", "bytes_received"):
+            turn[key] += attrs.get(key, 0)
+        turn["spans"].append(dict(attrs, span=name, start_ms=round((span_started - started) * 1000, 1),
+                                  duration_ms=round(span_duration * 1000, 1)))
+    return turn
+
+
+def print_breakdown(turn: dict, file=None):
+    """--profile output: one summary line per turn, then its spans in start order."""
+    file = file or sys.stderr
+    tokens = f"{turn['prompt_tokens']} prompt"
+    if turn['cached_tokens']:
+        tokens += f" ({turn['cached_tokens']} cached)"
+    print(f"[profile] turn {turn['turn']}: {turn['duration_ms'] / 1000:.2f}s, {turn['rounds']} rounds, "
+          f"{turn['tool_calls']} tool calls, {turn['retries']} retries, {tokens} / {turn['completion_tokens']} completion tokens, "
+          f"{turn['bytes_sent'] / 1024:.1f} KB sent / {turn['bytes_received'] / 1024:.1f} KB received", file=file)
+    for entry in turn['spans']:
+        details = " ".join(f"{key}={value}" for key, value in entry.items() if key not in ("span", "start_ms", "duration_ms"))
+        print(f"[profile]   {entry['start_ms']:>9.1f}ms  {entry['span']:<8} {entry['duration_ms']:>9.1f}ms  {details}", file=file)
+
+
+class JsonlExporter:
+    """Appends every turn as one JSON line."""
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+
+    def __call__(self, turn: dict):
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(turn) + "\n")
+
+
+class PrometheusExporter:
+    """
+    Keeps cumulative counters in a node_exporter textfile (`*.prom`), rewritten atomically
+    after every turn. Values already in the file are picked up, so the counters keep growing
+    across CLI invocations.
+    """
+
+    PREFIX = "llm_cli_"
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        self.values = {}
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if line.startswith(self.PREFIX):
+                        key, _, value = line.rstrip("\n").rpartition(" ")
+                        self.values[key] = float(value)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def _add(self, name: str, value: float, **labels):
+        label_text = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+        key = f"{self.PREFIX}{name}{{{label_text}}}" if labels else f"{self.PREFIX}{name}"
+        self.values[key] = self.values.get(key, 0) + value
+
+    def __call__(self, turn: dict):
+        from edit_engine import atomic_write
+        with self.lock:
+            self._add("turns_total", 1)
+            self._add("turn_seconds_total", turn["duration_ms"] / 1000)
+            for kind in ("prompt", "completion", "cached"):
+                self._add("tokens_total", turn[f"{kind}_tokens"], kind=kind)
+            self._add("bytes_total", turn["bytes_sent"], direction="sent")
+            self._add("bytes_total", turn["bytes_received"], direction="received")
+            for entry in turn["spans"]:
+                labels = {"span": entry["span"]}
+                if entry["span"] == "tool":
+                    labels["tool"] = entry.get("tool", "")
+                self._add("spans_total", 1, **labels)
+                self._add("span_seconds_total", entry["duration_ms"] / 1000, **labels)
+            lines = []
+            typed = set()
+            for key in sorted(self.values):
+                name = key.partition("{")[0]
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter\n")
+                value = self.values[key]
+                lines.append(f"{key} {int(value) if value == int(value) else round(value, 6)}\n")
+            atomic_write(self.path, "".join(lines))
+
+
+def exporter_for(path: str):
+    """A Prometheus textfile for `*.prom` paths, JSON lines otherwise."""
+    return PrometheusExporter(path) if path.endswith(".prom") else JsonlExporter(path)
@@ -0,0 +1,184 @@
+import json
+import random
+import re
+import threading
+import time
+
+# Client-side pacing of requests: retry backoff and per-minute request/token budgets
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter. A server supplied Retry-After always wins
+    over the computed delay (capped at max_delay).
+    """
+
+    def __init__(self, max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        """Seconds to wait before retry number `attempt` (starting at 0)."""
+        if retry_after is not None:
+            return min(max(retry_after, 0.0), self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute` units per minute, up to `per_minute` units."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)  # a single oversized request must still get through eventually
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def take(self, amount: float):
+        self.available -= min(amount, self.capacity)
+
+    def give_back(self, amount: float):
+        self.available = min(self.capacity, self.available + amount)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budget shared by every APIHandler in the process.
+    Limits are optional; when the backend reports x-ratelimit-* headers the limiter also pauses
+    as soon as the server says the remaining quota is exhausted.
+    """
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None):
+        self.lock = threading.Lock()
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.paused_until = 0.0
+
+    def try_acquire(self, estimated_tokens: int = 0) -> float:
+        """Reserves one request of `estimated_tokens` if it fits; otherwise returns the seconds to wait."""
+        with self.lock:
+            now = time.monotonic()
+            wait = self.paused_until - now
+            if self.requests:
+                wait = max(wait, self.requests.wait_time(1, now))
+            if self.tokens and estimated_tokens:
+                wait = max(wait, self.tokens.wait_time(estimated_tokens, now))
+            if wait > 0:
+                return wait
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens and estimated_tokens:
+                self.tokens.take(estimated_tokens)
+            return 0.0
+
+    def acquire(self, estimated_tokens: int = 0):
+        """Blocks until one request of `estimated_tokens` fits in the budget, then reserves it."""
+        wait = self.try_acquire(estimated_tokens)
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.try_acquire(estimated_tokens)
+
+    def settle(self, estimated_tokens: int, used_tokens: int = None):
+        """Returns the unused part of a reservation once the real usage is known."""
+        if self.tokens and used_tokens is not None and used_tokens < estimated_tokens:
+            with self.lock:
+                self.tokens.give_back(estimated_tokens - used_tokens)
+
+    def pause(self, seconds: float):
+        """Holds back every request in the process for `seconds` (e.g. after a 429)."""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers):
+        """Honors x-ratelimit-remaining-* / x-ratelimit-reset-* response headers."""
+        if not headers:
+            return
+        for kind in ('requests', 'tokens'):
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            if remaining <= 0:
+                reset = parse_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+                self.pause(reset if reset is not None else 1.0)
+
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value) -> float:
+    """Parses '20', '1.5s', '6m0s' or '250ms' style durations into seconds (None if unparseable)."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def parse_retry_after(headers) -> float:
+    """Seconds to wait according to retry-after-ms / Retry-After (delta-seconds or HTTP date)."""
+    if not headers:
+        return None
+    milliseconds = headers.get('retry-after-ms')
+    if milliseconds is not None:
+        try:
+            return float(milliseconds) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    seconds = parse_duration(value)
+    if seconds is not None:
+        return seconds
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(model_parameters: dict, messages_size: int = None) -> int:
+    """
+    Rough prompt + completion reservation for the tokens-per-minute bucket (about 4 chars per token).
+    Pass the size of the already encoded messages when there is one, so they are not encoded again.
+    """
+    if messages_size is None:
+        messages_size = len(json.dumps(model_parameters.get('messages', [])))
+    prompt = messages_size // 4
+    return prompt + model_parameters.get('max_completion_tokens', model_parameters.get('max_tokens', 0))
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_rate_limiter(**limits) -> RateLimiter:
+    """Returns the process-wide RateLimiter, creating it with `limits` on first use."""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter(**limits)
+        return _shared_limiter
@@ -0,0 +1,108 @@
+import json
+import threading
+from collections import OrderedDict
+
+# JSON request bodies, encoded incrementally: the history is append-only, so a message
+# that was sent before is not encoded again
+
+
+def get_codec(name: str = "auto"):
+    """
+    Returns dumps(obj) -> compact UTF-8 JSON bytes. "orjson" (several times faster than the
+    standard library), "json", or "auto" for orjson when it is installed. Values orjson
+    rejects (strings with lone surrogates, e.g. undecodable file names) go through json.
+    """
+    if name in ("auto", "orjson"):
+        try:
+            import orjson
+        except ImportError:
+            if name == "orjson":
+                raise
+        else:
+            def dumps(value) -> bytes:
+                try:
+                    return orjson.dumps(value)
+                except TypeError:
+                    return _json_dumps(value)
+            return dumps
+    return _json_dumps
+
+
+def _json_dumps(value) -> bytes:
+    # A lone surrogate becomes a \udcXX escape, which is valid JSON, instead of a UnicodeEncodeError
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8", "backslashreplace")
+
+
+class BodyEncoder:
+    """
+    Encodes request bodies, keeping the bytes of every dict inside a top-level list (the
+    messages, the tool schemas) keyed by the object. A cached dict is reused only while it
+    is the same object holding the same values, so replacing a message's content (as
+    Agent._replace_attachment does) or sending a truncated copy encodes it afresh. Nested
+    lists must not be edited in place. Least recently used entries go once `max_cached_bytes`
+    is exceeded.
+    """
+
+    def __init__(self, codec: str = "auto", max_cached_bytes: int = 64000000):
+        self.codec = codec
+        self.dumps = None
+        self.max_cached_bytes = max_cached_bytes
+        self.cached_bytes = 0
+        self.cache = OrderedDict()  # id(dict) -> (dict, its values, encoded)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def encode(self, body: dict, sizes: dict = None) -> bytes:
+        """The body as JSON bytes; `sizes`, if given, receives the encoded size of each top-level value."""
+        with self.lock:
+            if self.dumps is None:
+                self.dumps = get_codec(self.codec)
+            parts = []
+            for key, value in body.items():
+                if isinstance(value, list):
+                    encoded = b"[" + b",".join(self._item(item) for item in value) + b"]"
+                else:
+                    encoded = self.dumps(value)
+                if sizes is not None:
+                    sizes[key] = len(encoded)
+                parts.append(self.dumps(key) + b":" + encoded)
+            self._evict()
+            return b"{" + b",".join(parts) + b"}"
+
+    def _item(self, item) -> bytes:
+        if not isinstance(item, dict):
+            return self.dumps(item)
+        key = id(item)
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] is item and _same_values(entry[1], item):
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+        encoded = self.dumps(item)
+        if entry is not None:
+            self.cached_bytes -= len(entry[2])
+        self.cache[key] = (item, tuple(item.values()), encoded)
+        self.cache.move_to_end(key)
+        self.cached_bytes += len(encoded)
+        self.misses += 1
+        return encoded
+
+    def _evict(self):
+        while self.cached_bytes > self.max_cached_bytes and self.cache:
+            _, (_, _, encoded) = self.cache.popitem(last=False)
+            self.cached_bytes -= len(encoded)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.cached_bytes = 0
+
+
+def _same_values(values: tuple, item: dict) -> bool:
+    if len(values) != len(item):
+        return False
+    for old, new in zip(values, item.values()):
+        if old is not new:
+            return False
+    return True
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# Opt-in on-disk cache of chat completion responses, keyed by the request that produced them
+
+# Parameters that change how a response is delivered, not what it contains
+_TRANSPORT_ONLY = ('stream', 'stream_options')
+
+
+def cache_key(model_parameters: dict) -> str:
+    """sha256 of the canonical JSON of the request (model, messages, tools and sampling options)."""
+    canonical = {key: value for key, value in model_parameters.items() if key not in _TRANSPORT_ONLY}
+    encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite backed response cache with a time-to-live and least-recently-used eviction
+    once the stored responses exceed `max_bytes`. Safe to share between processes.
+    """
+
+    def __init__(self, path: str = "~/.cache/llm-cli/responses.sqlite3", ttl: float = 86400, max_bytes: int = 50000000):
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+
+    def _connect(self):
+        if self.db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        return self.db
+
+    def get(self, model_parameters: dict):
+        """Returns the cached response for this request, or None."""
+        db = self._connect()
+        key = cache_key(model_parameters)
+        now = time.time()
+        row = db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            self.misses += 1
+            return None
+        with db:
+            db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, model_parameters: dict, response: dict):
+        db = self._connect()
+        encoded = json.dumps(response, separators=(',', ':'))
+        now = time.time()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (cache_key(model_parameters), encoded, len(encoded), now, now)
+            )
+            self._evict(db, now)
+
+    def _evict(self, db, now: float):
+        db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        victims = []
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        db.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def stats(self) -> dict:
+        db = self._connect()
+        entries, size, oldest = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(created) FROM responses").fetchone()
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "oldest_age": round(time.time() - oldest, 1) if oldest else None,
+        }
+
+    def clear(self):
+        db = self._connect()
+        with db:
+            db.execute("DELETE FROM responses")
+        db.execute("VACUUM")
@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import deque
+from errors import APIError, RateLimitError, error_for_status
+from rate_limiter import RateLimiter, parse_retry_after
+
+# Spreads chat requests over several backends by rolling latency and error rate, with failover and optional hedging
+
+
+class Backend:
+    """
+    One endpoint plus its health: EWMA latency (time to response headers) and error rate,
+    the recent latencies for hedging, and a RateLimiter used as its cooldown (429s,
+    exhausted x-ratelimit quota, or too many failures in a row).
+    """
+
+    def __init__(self, name: str, url: str, headers: dict, model=None, weight: float = 1.0):
+        self.name = name
+        self.url = url
+        self.headers = headers
+        # A model name for every request, or a {requested model: backend model} mapping
+        self.model = model
+        self.weight = weight
+        self.limiter = RateLimiter()
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures_in_row = 0
+        self.recent = deque(maxlen=50)
+        self.last_used = None
+
+    def parameters(self, model_parameters: dict) -> dict:
+        if isinstance(self.model, dict):
+            model = self.model.get(model_parameters.get('model'))
+        else:
+            model = self.model
+        return dict(model_parameters, model=model) if model else model_parameters
+
+    def cooling_down(self, now: float) -> float:
+        """Seconds until the backend takes requests again (0 if it does now)."""
+        return max(self.limiter.paused_until - now, 0.0)
+
+    def percentile(self, fraction: float):
+        if len(self.recent) < 10:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class Router:
+    """
+    Picks the backend with the lowest latency / weight, inflated by its error rate (one that
+    has only failed counts as `initial_latency`). Backends never used, or not used for
+    `probe_interval` seconds, get the next request so their numbers stay current; among those
+    the highest weight goes first. A backend that answers 429 or fails `failure_threshold`
+    times in a row sits out `cooldown` seconds (or what Retry-After says).
+
+    With `hedge_after` (seconds, or "p95" for the chosen backend's own 95th percentile) a
+    request that has not got its response headers by then is duplicated to the next best
+    backend and the first answer wins. Hedged requests may be billed twice, so it is off by default.
+    """
+
+    def __init__(self, backends: list, hedge_after=None, cooldown: float = 30.0, failure_threshold: int = 3,
+                 initial_latency: float = 1.0, smoothing: float = 0.2, probe_interval: float = 60.0):
+        self.backends = backends
+        self.hedge_after = hedge_after
+        self.cooldown = cooldown
+        self.failure_threshold = failure_threshold
+        self.initial_latency = initial_latency
+        self.smoothing = smoothing
+        self.probe_interval = probe_interval
+        self.lock = threading.Lock()
+        self.executor = None
+        self.hedges = 0
+
+    def score(self, backend: Backend, now: float) -> float:
+        if backend.last_used is None or now - backend.last_used > self.probe_interval:
+            return 0.0
+        latency = backend.latency if backend.latency is not None else self.initial_latency
+        return latency * (1 + 4 * backend.error_rate) / backend.weight
+
+    def choose(self, exclude=()):
+        """The healthiest backend not in `exclude` and not cooling down, or None."""
+        now = time.monotonic()
+        with self.lock:
+            candidates = [backend for backend in self.backends if backend not in exclude and not backend.cooling_down(now)]
+            return min(candidates, key=lambda backend: (self.score(backend, now), -backend.weight)) if candidates else None
+
+    def wait_time(self) -> float:
+        now = time.monotonic()
+        return min((backend.cooling_down(now) for backend in self.backends), default=0.0)
+
+    def record_success(self, backend: Backend, latency: float):
+        with self.lock:
+            backend.latency = latency if backend.latency is None else backend.latency + self.smoothing * (latency - backend.latency)
+            backend.error_rate *= 1 - self.smoothing
+            backend.failures_in_row = 0
+            backend.recent.append(latency)
+            backend.last_used = time.monotonic()
+
+    def record_failure(self, backend: Backend, error: APIError):
+        with self.lock:
+            backend.error_rate += self.smoothing * (1 - backend.error_rate)
+            backend.failures_in_row += 1
+            backend.last_used = time.monotonic()
+            tripped = backend.failures_in_row >= self.failure_threshold
+        if isinstance(error, RateLimitError):
+            backend.limiter.pause(error.retry_after if error.retry_after is not None else min(self.cooldown, 5.0))
+        elif tripped and error.retryable:
+            backend.limiter.pause(self.cooldown)
+
+    def send(self, transport, model_parameters: dict, stream: bool = False, exclude: set = None):
+        """
+        Posts to the best backend (hedged if configured). Returns (response, backend) for a
+        200 answer; failed backends are added to `exclude` and the error is raised.
+        """
+        exclude = exclude if exclude is not None else set()
+        primary = self.choose(exclude)
+        if primary is None:
+            raise RateLimitError("every backend is cooling down", retry_after=self.wait_time())
+        delay = self._hedge_delay(primary)
+        secondary = self.choose(exclude | {primary}) if delay is not None else None
+        if secondary is None:
+            try:
+                return self._attempt(primary, transport, model_parameters, stream), primary
+            except APIError:
+                exclude.add(primary)
+                raise
+        return self._hedged(primary, secondary, delay, transport, model_parameters, stream, exclude)
+
+    def _hedge_delay(self, backend: Backend):
+        if self.hedge_after == "p95":
+            return backend.percentile(0.95)
+        return self.hedge_after
+
+    def _attempt(self, backend: Backend, transport, model_parameters: dict, stream: bool):
+        started = time.monotonic()
+        try:
+            response = transport.post(url=backend.url, headers=backend.headers, json=backend.parameters(model_parameters), stream=stream)
+        except APIError as error:
+            self.record_failure(backend, error)
+            raise
+        backend.limiter.update_from_headers(response.headers)
+        if response.status_code != 200:
+            error = error_for_status(response.status_code, response.text, parse_retry_after(response.headers))
+            response.close()
+            self.record_failure(backend, error)
+            raise error
+        self.record_success(backend, time.monotonic() - started)
+        return response
+
+    def _hedged(self, primary: Backend, secondary: Backend, delay: float, transport, model_parameters: dict, stream: bool, exclude: set):
+        from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+        futures = {self.executor.submit(self._attempt, primary, transport, model_parameters, stream): primary}
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            futures[self.executor.submit(self._attempt, secondary, transport, model_parameters, stream)] = secondary
+            with self.lock:
+                self.hedges += 1
+
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except APIError as failure:
+                    exclude.add(futures[future])
+                    error = failure
+                    continue
+                for loser in pending:
+                    loser.add_done_callback(_close_response)
+                return response, futures[future]
+        raise error
+
+
+def _close_response(future):
+    if future.exception() is None:
+        future.result().close()
@@ -0,0 +1,246 @@
+import fcntl
+import json
+import os
+import struct
+from contextlib import contextmanager
+
+# Append-only conversation log behind `llm --session NAME`
+
+_INDEX_ENTRY = struct.Struct("<IQIB")   # message number, byte offset of its latest record, tokens, is a user message
+
+
+def session_paths(directory: str, name: str):
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+    base = os.path.join(os.path.expanduser(directory), safe)
+    return base + ".jsonl", base + ".idx", base + ".lock"
+
+
+def encode_record(number: int, message: dict) -> bytes:
+    # Lone surrogates (undecodable file names from the tools) are written as \udcXX escapes, which json reads back as the same string
+    return (json.dumps({"n": number, "message": message}, ensure_ascii=False) + "\n").encode("utf-8", "backslashreplace")
+
+
+class SessionLog:
+    """
+    One session on disk. `NAME.jsonl` gets a `{"n": number, "message": ...}` line per saved
+    message (a later line with the same number supersedes the earlier one, e.g. when an
+    image was replaced by a placeholder) and `NAME.idx` a fixed-size entry per line with its
+    offset and token count. Saving a message is one append to each file, whatever the length
+    of the history; resuming reads the index and then only the records of the tail that fits.
+    A line cut short by a crash is dropped and lines missing from the index are re-indexed.
+
+    Several processes may write one session (a daemon and a --no-daemon run): appends,
+    recovery and compaction hold an flock on `NAME.lock`, and under it a writer first picks
+    up the index entries others appended, so every new message gets the log's real next
+    number. Each process maps its own Agent.messages positions to numbers; their turns end
+    up interleaved in the log and nothing is overwritten. Compaction keeps the numbers.
+    """
+
+    def __init__(self, directory: str, name: str, fsync: bool = False, count_tokens=None):
+        from context_window import count_message_tokens
+        self.name = name
+        self.path, self.index_path, lock_path = session_paths(directory, name)
+        self.fsync = fsync
+        self.count_tokens = count_tokens or count_message_tokens
+        self.numbers = []          # Agent.messages position -> log number, for the messages on disk
+        self.skipped = 0           # older messages load() left on disk
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.lock_file = open(lock_path, "ab")
+        self.log = None
+        with self._locked():
+            self._open()
+
+    @contextmanager
+    def _locked(self):
+        fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            if self.log is not None:
+                if self._replaced():
+                    # Compacted by another process; numbers are kept, so self.numbers stays valid
+                    self._close_files()
+                    self._open()
+                else:
+                    self._catch_up()
+            yield
+        finally:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _replaced(self) -> bool:
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.log.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _catch_up(self):
+        """Reads the index entries other processes appended since we last looked (or everything after a reset)."""
+        size = os.fstat(self.index.fileno()).st_size
+        if size < self.index_read:
+            self._close_files()
+            self._open()
+        elif size > self.index_read:
+            self._read_index(self.index_read)
+            self.size = os.fstat(self.log.fileno()).st_size
+
+    def _open(self):
+        self.entries = {}      # message number -> (offset, tokens, is user)
+        self.next_number = 0
+        self.index_read = 0    # bytes of NAME.idx already in self.entries
+        last_offset = self._read_index()
+        self.log = open(self.path, "ab")
+        self.index = open(self.index_path, "ab")
+        self.size = self._recover(last_offset)
+        self.index_read = os.fstat(self.index.fileno()).st_size
+
+    def _read_index(self, start: int = 0):
+        try:
+            with open(self.index_path, "rb") as file:
+                file.seek(start)
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        usable = len(data) - len(data) % _INDEX_ENTRY.size
+        if usable != len(data):
+            os.truncate(self.index_path, start + usable)  # half-written entry
+        last_offset = None
+        for number, offset, tokens, is_user in _INDEX_ENTRY.iter_unpack(data[:usable]):
+            self.entries[number] = (offset, tokens, bool(is_user))
+            self.next_number = max(self.next_number, number + 1)
+            last_offset = offset
+        self.index_read = start + usable
+        return last_offset
+
+    def _recover(self, last_offset) -> int:
+        """Indexes complete lines after the last indexed one and cuts off a partial last line."""
+        with open(self.path, "rb") as file:
+            position = 0
+            if last_offset is not None:
+                file.seek(last_offset)
+                position = last_offset + len(file.readline())
+            file.seek(position)
+            for line in file:
+                try:
+                    record = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    record = None
+                if record is None:
+                    break
+                self._index(record["n"], position, record["message"])
+                position += len(line)
+        if os.path.getsize(self.path) != position:
+            os.truncate(self.path, position)
+        return position
+
+    def _index(self, number: int, offset: int, message: dict):
+        entry = (offset, self.count_tokens(message), message.get('role') == 'user')
+        self.index.write(_INDEX_ENTRY.pack(number, *entry))
+        self.index.flush()
+        self.index_read += _INDEX_ENTRY.size
+        self.entries[number] = entry
+        self.next_number = max(self.next_number, number + 1)
+
+    def _write(self, number: int, message: dict) -> int:
+        """Appends a record; `number` None means the next free one. Returns the number used."""
+        data = None if number is None else encode_record(number, message)
+        with self._locked():
+            if number is None:
+                number = self.next_number
+                data = encode_record(number, message)
+            # Another process may have appended since our last write; the file size under the lock is exact
+            offset = os.fstat(self.log.fileno()).st_size
+            self.log.write(data)
+            self.log.flush()
+            if self.fsync:
+                os.fsync(self.log.fileno())
+            self.size = offset + len(data)
+            self._index(number, offset, message)
+        return number
+
+    def read(self, numbers) -> list:
+        """The latest version of each of the given messages (older turns are fetched this way on demand)."""
+        messages = []
+        with open(self.path, "rb") as file:
+            for number in numbers:
+                entry = self.entries.get(number)
+                if entry is None:
+                    continue
+                file.seek(entry[0])
+                messages.append(json.loads(file.readline())["message"])
+        return messages
+
+    def load(self, max_tokens: int) -> list:
+        """
+        The system message plus the newest turns whose tokens fit in `max_tokens` (at least
+        the last turn), as the start of Agent.messages. Empty for a new session.
+        """
+        with self._locked():
+            if not self.entries:
+                return []
+            total = self.entries[0][1] if 0 in self.entries else 0
+            start = None
+            for number in range(self.next_number - 1, 0, -1):
+                entry = self.entries.get(number)
+                if entry is None:
+                    continue
+                total += entry[1]
+                if total > max_tokens and start is not None:
+                    break
+                if entry[2]:
+                    start = number  # turns begin at a user message
+            start = start or 1
+            self.numbers = [number for number in [0] + list(range(start, self.next_number)) if number in self.entries]
+            self.skipped = sum(1 for number in self.entries if 0 < number < start)
+            return self.read(self.numbers)
+
+    def sync(self, messages: list):
+        """Saves the messages appended to Agent.messages since the last call."""
+        for position in range(len(self.numbers), len(messages)):
+            # The system message is always number 0; everything else goes after whatever is in the log by now
+            self.numbers.append(self._write(0 if position == 0 else None, messages[position]))
+
+    def replace(self, position: int, message: dict):
+        """Records a new version of an already saved message."""
+        if position < len(self.numbers):
+            self._write(self.numbers[position], message)
+
+    def reset(self, messages: list):
+        """Starts the session over with `messages` (Agent.clear_messages)."""
+        with self._locked():
+            self._close_files()
+            for path in (self.path, self.index_path):
+                open(path, "wb").close()
+            self._open()
+        self.numbers = []
+        self.skipped = 0
+        self.sync(messages)
+
+    def compact(self, keep_turns: int = None):
+        """
+        Rewrites the log with only the latest version of every message, and without the turns
+        before the last `keep_turns`. Returns (bytes before, bytes after). Numbers are kept, so
+        a process still writing the session carries on after it reopens the new file.
+        """
+        from edit_engine import atomic_write
+        with self._locked():
+            before = self.size
+            numbers = sorted(self.entries)
+            users = [number for number in numbers if self.entries[number][2]]
+            if keep_turns and len(users) > keep_turns:
+                cut = users[-keep_turns]
+                numbers = [number for number in numbers if number == 0 or number >= cut]
+            messages = self.read(numbers)
+            data = b"".join(encode_record(number, message) for number, message in zip(numbers, messages))
+
+            # Without an index the log is re-indexed from scratch on open, so a crash in between is harmless
+            self._close_files()
+            os.unlink(self.index_path)
+            atomic_write(self.path, data.decode("utf-8"))
+            self._open()
+        return before, self.size
+
+    def _close_files(self):
+        self.log.close()
+        self.index.close()
+
+    def close(self):
+        self._close_files()
+        self.lock_file.close()
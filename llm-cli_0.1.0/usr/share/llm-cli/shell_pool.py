@@ -0,0 +1,248 @@
+import os
+import re
+import select
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_SHELL_OWNED = {"PWD", "OLDPWD", "SHLVL", "_", "BASHOPTS", "SHELLOPTS", "BASH_VERSINFO", "EUID", "PPID", "UID"}
+
+# Long-lived bash sessions for execute_terminal: cwd, variables and venvs survive between calls
+
+
+class OutputCapture:
+    """Keeps the first and last `max_bytes // 2` bytes of a stream and counts what was dropped in between."""
+
+    def __init__(self, max_bytes: int):
+        self.half = max(max_bytes // 2, 1)
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        room = self.half - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > 2 * self.half:
+                del self.tail[:-self.half]
+
+    @property
+    def elided(self) -> int:
+        return max(0, self.total - len(self.head) - min(len(self.tail), self.half))
+
+    def text(self) -> str:
+        tail = bytes(self.tail[-self.half:])
+        if self.elided:
+            middle = f"\n...[{self.elided} bytes of output omitted]...\n".encode()
+            return (bytes(self.head) + middle + tail).decode('utf-8', errors='replace')
+        return (bytes(self.head) + tail).decode('utf-8', errors='replace')
+
+
+class CommandResult:
+    def __init__(self, output: str, exit_code: int = None, timed_out: bool = False, cancelled: bool = False, elided_bytes: int = 0):
+        self.output = output
+        self.exit_code = exit_code
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+        self.elided_bytes = elided_bytes
+
+
+class ShellSession:
+    """
+    One persistent bash process. Commands are written to its stdin followed by a unique
+    marker line carrying $? and $PWD, output (stdout and stderr merged) is read until the marker.
+    A command that times out or is cancelled kills the shell; the next command starts a new one
+    in the last known working directory.
+    """
+
+    def __init__(self, shell: str = "/bin/bash", cwd: str = None, max_output_bytes: int = 64000, env: dict = None):
+        self.shell = shell
+        self.cwd = cwd or os.getcwd()
+        self.env = env
+        self.pending_env = None
+        self.max_output_bytes = max_output_bytes
+        self.process = None
+        self.lock = threading.Lock()
+        self.cancel_requested = False
+        self.restarted = False
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            [self.shell, "--noprofile", "--norc"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=self.cwd if os.path.isdir(self.cwd) else None,
+            env=self.env,
+            start_new_session=True,  # own process group, so a timeout can kill the whole command tree
+        )
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def update_env(self, env: dict):
+        """Gives a running shell `env` before its next command (a new shell simply starts with it)."""
+        self.pending_env = env
+
+    def _env_script(self) -> str:
+        # Only what differs from the environment the shell got last time; variables set by earlier commands stay
+        env, self.pending_env = self.pending_env, None
+        if env is None:
+            return ""
+        previous = self.env if self.env is not None else os.environ
+        self.env = env
+        if not self.alive():
+            return ""
+        lines = [f"export {name}={shlex.quote(value)} 2>/dev/null" for name, value in env.items()
+                 if previous.get(name) != value and _NAME.fullmatch(name) and name not in _SHELL_OWNED]
+        lines += [f"unset {name} 2>/dev/null" for name in previous
+                  if name not in env and _NAME.fullmatch(name) and name not in _SHELL_OWNED]
+        return "".join(line + "\n" for line in lines)
+
+    def run(self, command: str, timeout: float = 300) -> CommandResult:
+        with self.lock:
+            environment = self._env_script()
+            if not self.alive():
+                self._start()
+            self.cancel_requested = False
+            marker = f"__LLM_CLI_DONE_{os.urandom(8).hex()}__"
+            # stdin is detached so a command waiting for input cannot swallow the marker line; the command
+            # is eval'd from a quoted string, so an unterminated quote or heredoc fails with status 2 right away
+            script = f"{environment}{{\neval {shlex.quote(command)}\n}} < /dev/null\nprintf '\\n{marker} %d %s\\n' \"$?\" \"$PWD\"\n"
+            try:
+                self.process.stdin.write(script.encode())
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError):
+                self._kill()
+                return CommandResult("shell exited before the command could run", exit_code=None)
+            return self._collect(marker.encode(), timeout)
+
+    def _collect(self, marker: bytes, timeout: float) -> CommandResult:
+        capture = OutputCapture(self.max_output_bytes)
+        pending = b""
+        deadline = time.monotonic() + timeout
+        fd = self.process.stdout.fileno()
+        needle = b"\n" + marker
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.cancel_requested:
+                cancelled = self.cancel_requested
+                capture.write(pending)
+                self._kill()
+                return CommandResult(capture.text(), timed_out=not cancelled, cancelled=cancelled, elided_bytes=capture.elided)
+
+            ready, _, _ = select.select([fd], [], [], min(remaining, 0.2))
+            if not ready:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                # The command exited the shell itself
+                capture.write(pending)
+                exit_code = self.process.wait()
+                self.process = None
+                return CommandResult(capture.text(), exit_code=exit_code, elided_bytes=capture.elided)
+
+            pending += chunk
+            index = pending.find(needle)
+            if index >= 0 and pending.find(b"\n", index + len(needle)) >= 0:
+                capture.write(pending[:index])
+                status = pending[index + len(needle):].split(b"\n", 1)[0].decode(errors='replace').strip()
+                code, _, cwd = status.partition(" ")
+                if cwd:
+                    self.cwd = cwd
+                return CommandResult(capture.text(), exit_code=int(code), elided_bytes=capture.elided)
+
+            # Hold back enough bytes to recognise a marker split across reads
+            keep = len(needle) + 4096
+            if len(pending) > keep:
+                capture.write(pending[:-keep])
+                pending = pending[-keep:]
+
+    def cancel(self):
+        """Aborts the running command (from another thread); the shell is restarted on next use."""
+        self.cancel_requested = True
+
+    def _kill(self):
+        if self.process is not None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+            self.process.wait()
+            self.process = None
+            self.restarted = True
+
+    def close(self):
+        with self.lock:
+            if self.alive():
+                try:
+                    self.process.stdin.close()
+                    self.process.wait(timeout=1)
+                except (OSError, subprocess.TimeoutExpired):
+                    pass
+            self._kill()
+
+
+class ShellPool:
+    """
+    Named ShellSessions, at most `max_sessions` alive (least recently used ones are closed).
+    New sessions start in `cwd` with `env` (the process's own when None); set_environment
+    also hands a new `env` to the shells already running.
+    """
+
+    def __init__(self, max_sessions: int = 4, max_output_bytes: int = 64000, shell: str = "/bin/bash"):
+        self.max_sessions = max_sessions
+        self.max_output_bytes = max_output_bytes
+        self.shell = shell
+        self.cwd = None
+        self.env = None
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, name: str = "default") -> ShellSession:
+        with self.lock:
+            session = self.sessions.get(name)
+            if session is None:
+                session = ShellSession(self.shell, cwd=self.cwd, max_output_bytes=self.max_output_bytes, env=self.env)
+                self.sessions[name] = session
+            self.sessions.move_to_end(name)
+            evicted = []
+            while len(self.sessions) > self.max_sessions:
+                evicted.append(self.sessions.popitem(last=False)[1])
+        # Closed outside the pool lock: close() waits for a running command, which must not stall other shells
+        for oldest in evicted:
+            if oldest.lock.locked():
+                threading.Thread(target=oldest.close, daemon=True, name="shell-close").start()
+            else:
+                oldest.close()
+        return session
+
+    def set_environment(self, cwd: str = None, env: dict = None):
+        with self.lock:
+            self.cwd = cwd
+            self.env = env
+            sessions = list(self.sessions.values())
+        if env is not None:
+            for session in sessions:
+                session.update_env(env)
+
+    def cancel(self, name: str = "default"):
+        session = self.sessions.get(name)
+        if session:
+            session.cancel()
+
+    def close_all(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            session.close()
@@ -0,0 +1,178 @@
+import json
+
+# Helpers for the server-sent-events (SSE) flavour of the chat completions API
+
+
+class SSEDecoder:
+    """
+    Incremental decoder for the `data:` events of an SSE stream.
+    Feed it one line at a time (bytes or str, with or without line ending).
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.done = False
+
+    def feed(self, raw_line):
+        """Returns the decoded JSON payload if this line completes an event, otherwise None."""
+        line = raw_line.decode('utf-8') if isinstance(raw_line, bytes) else raw_line
+        line = line.rstrip('\r\n')
+
+        # A blank line terminates the current event
+        if not line:
+            return self.flush()
+        if line.startswith(':'):
+            return None  # comment / keep-alive
+        if line.startswith('data:'):
+            self.buffer.append(line[5:].lstrip())
+        return None
+
+    def flush(self):
+        if not self.buffer:
+            return None
+        data = "\n".join(self.buffer)
+        self.buffer = []
+        if data == "[DONE]":
+            self.done = True
+            return None
+        return json.loads(data)
+
+
+def iter_sse_data(lines):
+    """
+    Yields the decoded JSON payload of every `data:` event in an SSE stream.
+
+    Parameters:
+        lines (iterable): Raw lines of the response body (bytes or str).
+    """
+    decoder = SSEDecoder()
+    for line in lines:
+        payload = decoder.feed(line)
+        if payload is not None:
+            yield payload
+        if decoder.done:
+            return
+    payload = decoder.flush()
+    if payload is not None:
+        yield payload
+
+
+async def aiter_sse_data(lines):
+    """Async variant of iter_sse_data for `async for` line sources (e.g. aiohttp's response.content)."""
+    decoder = SSEDecoder()
+    async for line in lines:
+        payload = decoder.feed(line)
+        if payload is not None:
+            yield payload
+        if decoder.done:
+            return
+    payload = decoder.flush()
+    if payload is not None:
+        yield payload
+
+
+class StreamAccumulator:
+    """
+    Reassembles streamed chat completion chunks into the same shape as a
+    non-streaming response, so Agent.chat can treat both paths alike.
+    Audio deltas are handed to `on_audio(base64 data)` instead of being kept; their
+    transcript counts as text and the audio id is reported like in a non-streaming response.
+    """
+
+    def __init__(self, on_audio=None):
+        self.on_audio = on_audio
+        self.audio_id = None
+        self.role = "assistant"
+        self.content_parts = []
+        self.tool_calls = {}
+        self.finish_reason = None
+        self.usage = None
+        self.response_id = None
+        self.model = None
+
+    def add(self, chunk: dict) -> str:
+        """
+        Merges one chunk into the accumulated message.
+
+        Returns:
+            str: The text content carried by this chunk ("" if none).
+        """
+        self.response_id = chunk.get('id', self.response_id)
+        self.model = chunk.get('model', self.model)
+        if chunk.get('usage'):
+            self.usage = chunk['usage']
+
+        text = ""
+        for choice in chunk.get('choices') or []:
+            delta = choice.get('delta') or {}
+            if delta.get('role'):
+                self.role = delta['role']
+            if delta.get('content'):
+                text += delta['content']
+            audio = delta.get('audio')
+            if audio:
+                self.audio_id = audio.get('id', self.audio_id)
+                if audio.get('transcript'):
+                    text += audio['transcript']
+                if audio.get('data') and self.on_audio:
+                    self.on_audio(audio['data'])
+            for fragment in delta.get('tool_calls') or []:
+                self._add_tool_call_fragment(fragment)
+            if choice.get('finish_reason'):
+                self.finish_reason = choice['finish_reason']
+
+        if text:
+            self.content_parts.append(text)
+        return text
+
+    def _add_tool_call_fragment(self, fragment: dict):
+        # The first fragment of a call carries id/name, later ones only argument pieces
+        call = self.tool_calls.setdefault(fragment.get('index', 0), {
+            "id": None,
+            "type": "function",
+            "function": {"name": "", "arguments": ""}
+        })
+        if fragment.get('id'):
+            call['id'] = fragment['id']
+        if fragment.get('type'):
+            call['type'] = fragment['type']
+        function = fragment.get('function') or {}
+        if function.get('name'):
+            call['function']['name'] += function['name']
+        if function.get('arguments'):
+            call['function']['arguments'] += function['arguments']
+
+    def message(self) -> dict:
+        message = {"role": self.role, "content": "".join(self.content_parts) or None}
+        if self.tool_calls:
+            message['tool_calls'] = [self.tool_calls[index] for index in sorted(self.tool_calls)]
+        if self.audio_id:
+            message['audio'] = {"id": self.audio_id}
+        return message
+
+    def response(self) -> dict:
+        """Returns the accumulated stream as a regular chat completion response."""
+        response = {
+            "id": self.response_id,
+            "model": self.model,
+            "choices": [{"index": 0, "message": self.message(), "finish_reason": self.finish_reason}]
+        }
+        if self.usage:
+            response['usage'] = self.usage
+        return response
+
+
+def response_to_chunks(response: dict):
+    """Replays a complete (e.g. cached) response as stream chunks, one per choice."""
+    for index, choice in enumerate(response.get('choices') or []):
+        message = choice.get('message') or {}
+        delta = {"role": message.get('role', 'assistant'), "content": message.get('content')}
+        if message.get('tool_calls'):
+            delta['tool_calls'] = [dict(call, index=position) for position, call in enumerate(message['tool_calls'])]
+        yield {
+            "id": response.get('id'),
+            "model": response.get('model'),
+            "choices": [{"index": choice.get('index', index), "delta": delta, "finish_reason": choice.get('finish_reason')}]
+        }
+    if response.get('usage'):
+        yield {"id": response.get('id'), "model": response.get('model'), "choices": [], "usage": response['usage']}
@@ -0,0 +1,168 @@
+import queue
+import re
+import threading
+import time
+
+# Runs the subtasks of Functions.execute_task as a dependency graph on a pool of executor agents
+
+_TASK_PATTERN = re.compile(r'<task:(\w+)((?:\s+\w+="[^"]*")*)\s*>(.*?)</task:\1>', re.S)
+_ATTRIBUTE_PATTERN = re.compile(r'(\w+)="([^"]*)"')
+
+
+class Subtask:
+    def __init__(self, task_id: str, content: str, depends: list):
+        self.task_id = task_id
+        self.content = content.strip()
+        self.depends = depends
+        self.status = "pending"   # pending, running, done, failed, skipped
+        self.result = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def duration(self) -> float:
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+def parse_subtasks(text: str) -> dict:
+    """
+    Parses `<task:N>...</task:N>` blocks; `depends="1,3"` (or `after="..."`) lists the
+    tasks whose results this one needs. Returns {task id: Subtask} in document order.
+    """
+    subtasks = {}
+    for task_id, attributes, content in _TASK_PATTERN.findall(text or ""):
+        depends = []
+        for name, value in _ATTRIBUTE_PATTERN.findall(attributes):
+            if name in ("depends", "after"):
+                depends += [part.strip().replace("task", "") for part in value.split(",") if part.strip()]
+        subtasks[task_id] = Subtask(task_id, content, depends)
+    return subtasks
+
+
+class TaskScheduler:
+    """
+    Starts every subtask as soon as all of its dependencies are done, with at most
+    `max_workers` running at once. Each worker borrows an executor Agent from a pool
+    (created on demand by `agent_factory`) whose history is cleared per subtask, and the
+    results of the dependencies are passed in the prompt. When a subtask fails, everything
+    that depends on it is skipped while independent branches keep running.
+    """
+
+    def __init__(self, agent_factory, max_workers: int = 4, timeout: float = None):
+        self.agent_factory = agent_factory
+        self.max_workers = max_workers
+        self.timeout = timeout
+        # Where the executors' tool call traces go; set by execute_task to its own output
+        self.output = None
+        self.agents = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _borrow_agent(self):
+        with self.lock:
+            if self.agents.empty() and self.created < self.max_workers:
+                self.created += 1
+                return self.agent_factory()
+        return self.agents.get()
+
+    def close(self):
+        """Closes the tools (shells, indexes) of the executor agents created so far."""
+        while not self.agents.empty():
+            functions = getattr(self.agents.get(), "functions", None)
+            if functions is not None:
+                functions.close()
+
+    def run(self, subtasks: dict) -> dict:
+        from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+        for subtask in subtasks.values():
+            missing = [dependency for dependency in subtask.depends if dependency not in subtasks]
+            if missing:
+                subtask.status = "skipped"
+                subtask.result = f"unknown dependencies: {', '.join(missing)}"
+
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        running = {}
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="subtask")
+        while True:
+            self._skip_blocked(subtasks)
+            for subtask in subtasks.values():
+                if subtask.status == "pending" and all(subtasks[d].status == "done" for d in subtask.depends):
+                    subtask.status = "running"
+                    running[executor.submit(self._execute, subtask, subtasks)] = subtask
+            if not running:
+                break
+
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            finished, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not finished:
+                # Out of time: report what is still running as failed and do not wait for it
+                for subtask in running.values():
+                    subtask.status = "failed"
+                    subtask.result = f"timed out after {self.timeout}s"
+                for subtask in subtasks.values():
+                    if subtask.status == "pending":
+                        subtask.status = "skipped"
+                        subtask.result = "not started before the task timed out"
+                break
+            for future in finished:
+                running.pop(future)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        # Whatever is still pending can never become ready (dependency cycle)
+        for subtask in subtasks.values():
+            if subtask.status == "pending":
+                subtask.status = "skipped"
+                subtask.result = "part of a dependency cycle"
+        return subtasks
+
+    def _skip_blocked(self, subtasks: dict):
+        changed = True
+        while changed:
+            changed = False
+            for subtask in subtasks.values():
+                if subtask.status != "pending":
+                    continue
+                blocked = [d for d in subtask.depends if subtasks[d].status in ("failed", "skipped")]
+                if blocked:
+                    subtask.status = "skipped"
+                    subtask.result = f"skipped because {', '.join('task' + d for d in blocked)} did not complete"
+                    changed = True
+
+    def _execute(self, subtask: Subtask, subtasks: dict):
+        agent = self._borrow_agent()
+        subtask.started = time.monotonic()
+        try:
+            if self.output is not None and hasattr(agent, "set_output"):
+                agent.set_output(self.output)
+            agent.clear_messages()
+            prompt = f"Execute subtask: <Subtask>{subtask.content}</Subtask>"
+            if subtask.depends:
+                context = "\n".join(f"<Result task=\"{d}\">{subtasks[d].result}</Result>" for d in subtask.depends)
+                prompt += f"\nResults of the subtasks this one depends on:\n{context}"
+            result = agent.chat([{"type": "text", "text": prompt}])
+            if subtask.status == "running":  # not already given up on by a timeout
+                failed = result is None or str(result).startswith("Request failed:")
+                subtask.status = "failed" if failed else "done"
+                subtask.result = result
+        except Exception as e:
+            if subtask.status == "running":
+                subtask.status = "failed"
+                subtask.result = f"error: {e}"
+        finally:
+            subtask.finished = time.monotonic()
+            self.agents.put(agent)
+
+
+def format_summary(subtasks: dict, wall_clock: float) -> str:
+    lines = [f"Subtask task{task_id}: {subtask.result}" for task_id, subtask in subtasks.items()]
+    lines.append("")
+    lines.append("Timing:")
+    for task_id, subtask in subtasks.items():
+        depends = f" (after {', '.join(subtask.depends)})" if subtask.depends else ""
+        lines.append(f"  task{task_id}: {subtask.status}, {subtask.duration:.1f}s{depends}")
+    total = sum(subtask.duration for subtask in subtasks.values())
+    lines.append(f"  wall clock {wall_clock:.1f}s, sum of subtasks {total:.1f}s")
+    return "\n".join(lines)
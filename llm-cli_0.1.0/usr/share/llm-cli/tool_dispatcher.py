@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from instrumentation import span
+
+# Runs the tool calls of one assistant turn concurrently
+
+
+class _Job:
+    def __init__(self, tool_call: dict):
+        self.tool_call = tool_call
+        self.name = tool_call['function']['name']
+        self.arguments = None
+        self.error = None
+        self.timeout = None
+        # concurrent.futures is imported on first use to keep CLI startup fast
+        from concurrent.futures import Future
+        self.future = Future()
+        self.started = None
+        self.started_event = threading.Event()
+        self.skipped = False
+        # Guards started/skipped: a job is either skipped before it starts or runs to the end
+        self.lock = threading.Lock()
+
+
+class ToolDispatcher:
+    """
+    Executes the tool calls of a turn on a thread pool, so independent calls take the
+    time of the slowest one instead of the sum.
+
+    Calls for which functions.serialization_key(name, arguments) returns the same key
+    (e.g. two edits of one file) run one after another in their original order.
+
+    A call has its timeout to get a worker (counted from run()) and then its timeout to
+    finish. A call that does not finish is abandoned together with its worker: the pool is
+    replaced and the lanes still waiting in it are moved to the new one, so hung tools
+    cannot starve the rest of the turn or later turns.
+    """
+
+    def __init__(self, functions_handler: object, max_workers: int = 4, timeout: float = 120, tool_timeouts: dict = None):
+        self.functions = functions_handler
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.tool_timeouts = tool_timeouts or {}
+        self.executor = None
+
+    def _get_executor(self):
+        if self.executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+        return self.executor
+
+    def run(self, tool_calls: list) -> list:
+        """
+        Runs every call and returns [(tool_call, arguments, output), ...] in the order of `tool_calls`.
+        Errors and timeouts are reported as output strings so the model can react to them.
+        """
+        jobs = [_Job(tool_call) for tool_call in tool_calls]
+        lanes = {}
+        for index, job in enumerate(jobs):
+            try:
+                job.arguments = json.loads(job.tool_call['function']['arguments'] or "{}")
+            except json.JSONDecodeError as e:
+                job.error = f"Error: invalid JSON arguments for {job.name}: {e}"
+                continue
+            job.timeout = self.tool_timeouts.get(job.name, self.timeout)
+            key = self._serialization_key(job)
+            lanes.setdefault(key if key is not None else ('call', index), []).append(job)
+
+        started = time.monotonic()
+        executor = self._get_executor()
+        submitted = [(executor.submit(self._run_lane, lane), lane) for lane in lanes.values()]
+
+        for lane in lanes.values():
+            stuck = False
+            for job in lane:
+                # The worker is stuck on an earlier call; later calls in the lane must not wait for it
+                if stuck and self._skip(job, "not run, an earlier call on the same resource timed out"):
+                    continue
+                if not self._wait(job, started):
+                    stuck = True
+                    if job.started is not None:
+                        submitted = self._replace_executor(submitted)
+
+        return [(job.tool_call, job.arguments, job.error if job.error is not None else job.future.result()) for job in jobs]
+
+    def _serialization_key(self, job: _Job):
+        get_key = getattr(self.functions, 'serialization_key', None)
+        return get_key(job.name, job.arguments) if get_key else None
+
+    def _replace_executor(self, submitted: list) -> list:
+        """Leaves the old pool to its stuck worker and moves the lanes that have not started to a new one."""
+        old = self.executor
+        self.executor = None
+        executor = self._get_executor()
+        moved = []
+        for future, lane in submitted:
+            if future.cancel():
+                future = executor.submit(self._run_lane, lane)
+            moved.append((future, lane))
+        if old is not None:
+            old.shutdown(wait=False)
+        return moved
+
+    def _skip(self, job: _Job, reason: str) -> bool:
+        """Marks `job` as not run, unless a worker has already started it. Returns True if skipped."""
+        with job.lock:
+            if job.started is not None:
+                return False
+            job.skipped = True
+            job.error = f"Error: {job.name} {reason}"
+            return True
+
+    def _run_lane(self, lane: list):
+        for job in lane:
+            with job.lock:
+                if job.skipped:
+                    continue
+                job.started = time.monotonic()
+            job.started_event.set()
+            with span("tool", tool=job.name) as tool_span:
+                try:
+                    output = self.functions.run_tool(job.name, job.arguments)
+                except Exception as e:
+                    output = f"Error running {job.name}: {e}"
+                    tool_span.set(error=type(e).__name__)
+            job.future.set_result(output)
+
+    def _wait(self, job: _Job, run_started: float) -> bool:
+        """
+        Waits for `job` to start (up to its timeout from `run_started`) and to finish (up to its
+        timeout from when it started). Returns False if it was skipped or timed out.
+        """
+        from concurrent.futures import TimeoutError
+        if job.skipped:
+            return False
+        if not job.started_event.wait(max(run_started + job.timeout - time.monotonic(), 0)):
+            if self._skip(job, f"not run, no worker became free within {job.timeout}s"):
+                return False
+            job.started_event.wait()  # a worker took it just now
+        remaining = job.started + job.timeout - time.monotonic()
+        try:
+            job.future.result(timeout=max(remaining, 0))
+            return True
+        except TimeoutError:
+            job.error = f"Error: {job.name} timed out after {job.timeout}s"
+            return False
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
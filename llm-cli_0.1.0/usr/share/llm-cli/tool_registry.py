@@ -0,0 +1,158 @@
+import re
+import threading
+
+# Declarative tools: @tool on a method; schemas derived from its signature once per class
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+_PYTHON_TYPES = {"string": str, "integer": int, "number": (int, float), "boolean": bool, "array": list, "object": dict}
+
+
+class ToolArgumentError(ValueError):
+    pass
+
+
+def tool(description: str, parameters: dict = None, resource=None, matches: str = None, always: bool = False):
+    """
+    Registers a method as a tool.
+
+    description: what the model sees for the tool.
+    parameters: {name: description} or {name: schema dict} for the signature's parameters.
+    resource: function(arguments) -> the resource a call touches; calls on the same one run one after another.
+    matches: regex tested against the latest user message when only relevant tools are sent.
+    always: sent even when the tool set is pruned.
+    """
+    def decorate(function):
+        function.tool_spec = {"description": description, "parameters": parameters or {},
+                              "resource": resource, "matches": matches, "always": always}
+        return function
+    return decorate
+
+
+class Tool:
+    def __init__(self, name: str, function, spec: dict):
+        self.name = name
+        self.function = function
+        self.resource = spec["resource"]
+        self.always = spec["always"]
+        self.matches = re.compile(spec["matches"], re.I) if spec["matches"] else None
+        self.schema = self._build_schema(spec)
+        properties = self.schema["function"]["parameters"]["properties"]
+        self.required = tuple(self.schema["function"]["parameters"]["required"])
+        self.types = {key: _PYTHON_TYPES.get(value.get("type")) for key, value in properties.items()}
+
+    def _build_schema(self, spec: dict) -> dict:
+        # Read straight from the code object; inspect.signature would cost more to import than everything else here
+        code = self.function.__code__
+        names = code.co_varnames[1:code.co_argcount]  # skip self
+        defaults = self.function.__defaults__ or ()
+        defaults = dict(zip(names[len(names) - len(defaults):], defaults))
+        annotations = self.function.__annotations__
+        properties = {}
+        required = []
+        for name in names:
+            schema = {}
+            kind = annotations.get(name, type(defaults.get(name)))
+            if kind in _JSON_TYPES:
+                schema["type"] = _JSON_TYPES[kind]
+            extra = spec["parameters"].get(name)
+            if isinstance(extra, str):
+                schema["description"] = extra
+            elif extra:
+                schema.update(extra)
+            if name not in defaults:
+                required.append(name)
+            elif defaults[name] is not None:
+                schema["default"] = defaults[name]
+            properties[name] = schema
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": spec["description"],
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            },
+        }
+
+    def validate(self, arguments: dict):
+        if not isinstance(arguments, dict):
+            raise ToolArgumentError(f"{self.name} expects a JSON object of arguments")
+        missing = [name for name in self.required if name not in arguments]
+        if missing:
+            raise ToolArgumentError(f"{self.name} is missing required argument(s): {', '.join(missing)}")
+        for name, value in arguments.items():
+            if name not in self.types:
+                raise ToolArgumentError(f"{self.name} has no argument '{name}'; it takes {', '.join(self.types)}")
+            expected = self.types[name]
+            if value is None or expected is None:
+                continue
+            if not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+                if expected is int and isinstance(value, float) and value.is_integer():
+                    arguments[name] = int(value)
+                    continue
+                raise ToolArgumentError(f"{self.name} argument '{name}' should be {self.schema['function']['parameters']['properties'][name]['type']}, got {type(value).__name__}")
+
+
+class ToolRegistry:
+    """
+    The @tool methods of one class, in definition order. Built once per class and shared
+    by every instance; schemas and their JSON encoding are computed at that point.
+    """
+
+    _by_class = {}
+    _lock = threading.Lock()
+
+    def __init__(self, cls):
+        self.tools = {}
+        for klass in reversed(cls.__mro__):
+            for name, function in vars(klass).items():
+                spec = getattr(function, "tool_spec", None)
+                if spec is not None:
+                    self.tools[name] = Tool(name, function, spec)
+        self.schemas = [entry.schema for entry in self.tools.values()]
+        self._selections = {}
+
+    @classmethod
+    def for_class(cls, owner_class):
+        with cls._lock:
+            registry = cls._by_class.get(owner_class)
+            if registry is None:
+                registry = cls._by_class[owner_class] = cls(owner_class)
+            return registry
+
+    def run(self, owner, name: str, arguments: dict) -> str:
+        entry = self.tools.get(name)
+        if entry is None:
+            raise ToolArgumentError(f"unknown tool '{name}'; available: {', '.join(self.tools)}")
+        entry.validate(arguments)
+        return str(entry.function(owner, **arguments))
+
+    def resource(self, name: str, arguments: dict):
+        entry = self.tools.get(name)
+        return entry.resource(arguments) if entry and entry.resource else None
+
+    def select(self, text: str, exclude: tuple = ()) -> list:
+        """
+        The schemas relevant to `text`: tools marked always plus those whose pattern matches.
+        The same subset comes back as the same list object, so callers can cache on it.
+        """
+        names = tuple(name for name, entry in self.tools.items() if name not in exclude
+                      and (entry.always or (entry.matches and entry.matches.search(text or ""))))
+        return self.subset(names)
+
+    def subset(self, names: tuple) -> list:
+        """The schemas of `names`, as the same list object for the same names."""
+        with self._lock:
+            selection = self._selections.get(names)
+            if selection is None:
+                selection = self._selections[names] = [self.tools[name].schema for name in names]
+            return selection
+
+
+def latest_user_text(messages: list) -> str:
+    for message in reversed(messages or []):
+        if message.get('role') == 'user':
+            content = message.get('content')
+            if isinstance(content, str):
+                return content
+            return " ".join(part.get('text', '') for part in content or [] if part.get('type') == 'text')
+    return ""
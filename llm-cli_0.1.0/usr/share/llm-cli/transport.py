@@ -0,0 +1,120 @@
+# Dependencies
+import threading
+from errors import TransportError
+from request_body import BodyEncoder
+
+# This program holds the pooled, keep-alive HTTP connections used by the API handlers
+
+
+class Transport:
+    """
+    Keep-alive HTTP transport backed by a pooled requests.Session.
+    One instance can be shared by any number of APIHandlers/Agents (also across threads),
+    so consecutive requests to the same endpoint reuse the open TCP+TLS connection.
+    requests itself is only imported when the first request is sent.
+    """
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 16, connect_timeout: float = 10, read_timeout: float = 300,
+                 json_codec: str = "auto", body_cache_bytes: int = 64000000):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = None
+        self.lock = threading.Lock()
+        # Messages already sent are not encoded again, see request_body.BodyEncoder
+        self.encoder = BodyEncoder(json_codec, body_cache_bytes)
+
+    def _get_session(self):
+        with self.lock:
+            if self.session is None:
+                import requests as rq
+                from requests.adapters import HTTPAdapter
+                session = rq.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self.session = session
+            return self.session
+
+    def encode(self, body: dict, sizes: dict = None) -> bytes:
+        return self.encoder.encode(body, sizes)
+
+    def post(self, url: str, headers: dict, json: dict = None, data: bytes = None, stream: bool = False):
+        """`json` is encoded with self.encoder (not by requests); `data` is sent as already encoded JSON."""
+        import requests as rq
+        session = self._get_session()
+        if json is not None:
+            data = self.encode(json)
+        try:
+            return session.post(url=url, headers=_json_headers(headers), data=data, stream=stream, timeout=self.timeout)
+        except rq.RequestException as e:
+            raise TransportError(f"api request failed: {e}") from e
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+def _json_headers(headers: dict) -> dict:
+    if any(name.lower() == "content-type" for name in headers):
+        return headers
+    return dict(headers, **{"Content-Type": "application/json"})
+
+
+_shared_transport = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_transport(**settings) -> Transport:
+    """
+    Returns the process-wide Transport, creating it with `settings` on first use.
+    Later calls ignore `settings` and hand out the same pool.
+    """
+    global _shared_transport
+    with _shared_lock:
+        if _shared_transport is None:
+            _shared_transport = Transport(**settings)
+        return _shared_transport
+
+
+class AsyncTransport:
+    """
+    asyncio counterpart of Transport, backed by an aiohttp.ClientSession with a bounded connector.
+    Create it inside the event loop that will use it and share it between AsyncAPIHandlers.
+    """
+
+    def __init__(self, pool_maxsize: int = 16, connect_timeout: float = 10, read_timeout: float = 300,
+                 json_codec: str = "auto", body_cache_bytes: int = 64000000):
+        try:
+            import aiohttp
+        except ImportError as e:
+            raise ImportError("AsyncTransport requires aiohttp (pip install aiohttp)") from e
+
+        self._aiohttp = aiohttp
+        self.pool_maxsize = pool_maxsize
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.session = None
+        self.encoder = BodyEncoder(json_codec, body_cache_bytes)
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            connector = self._aiohttp.TCPConnector(limit=self.pool_maxsize)
+            self.session = self._aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self.session
+
+    def encode(self, body: dict, sizes: dict = None) -> bytes:
+        return self.encoder.encode(body, sizes)
+
+    async def post(self, url: str, headers: dict, json: dict = None, data: bytes = None):
+        """Returns the aiohttp response; the caller must release() it."""
+        import asyncio
+        if json is not None:
+            data = self.encode(json)
+        try:
+            return await self._get_session().post(url, headers=_json_headers(headers), data=data)
+        except (self._aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise TransportError(f"api request failed: {e}") from e
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
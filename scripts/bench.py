@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Benchmarks Agent, APIHandler and Functions against the local mock server
+(scripts/mock_openai.py) instead of the paid endpoint.
+
+Each scenario scripts the mock, runs a number of turns and records p50/p95/mean turn
+latency, throughput and memory. Results go to a JSON file; pass an earlier one with
+--compare to see the change per scenario, e.g. before and after a commit:
+
+    python3 scripts/bench.py --out bench-before.json
+    python3 scripts/bench.py --out bench-after.json --compare bench-before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIBRARY = os.path.join(ROOT, "llm-cli_0.1.0", "usr", "share", "llm-cli")
+MOCK = os.path.join(ROOT, "scripts", "mock_openai.py")
+sys.path.insert(0, LIBRARY)
+
+
+class Mock:
+    """The mock server in its own process, so it does not compete with the client for the GIL."""
+
+    def __init__(self):
+        self.process = subprocess.Popen([sys.executable, MOCK, "--port", "0"], stdout=subprocess.PIPE, text=True)
+        self.url = self.process.stdout.readline().strip()
+        self.base = self.url.split("/v1/")[0]
+        self.defaults = {}
+
+    def script(self, **script):
+        import requests
+        requests.post(f"{self.base}/_script", json=dict(self.defaults, **script)).raise_for_status()
+
+    def stats(self) -> dict:
+        import requests
+        return requests.get(f"{self.base}/_stats").json()
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def build_agent(url: str, system_message: str = None):
+    from agent import Agent
+    from api_handler import APIHandler
+    from functions_handler import Functions
+    from rate_limiter import RetryPolicy, RateLimiter
+    from transport import get_shared_transport
+    api = APIHandler(url, {"Content-Type": "application/json"}, transport=get_shared_transport(),
+                     retry_policy=RetryPolicy(max_retries=10, base_delay=0.01, max_delay=0.05),
+                     rate_limiter=RateLimiter())
+    return Agent(api, Functions(), system_message=system_message or "You are a benchmark.")
+
+
+def release(agent):
+    agent.functions.close()
+    if agent.tool_dispatcher:
+        agent.tool_dispatcher.shutdown()
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return 0.0
+
+
+def run_turns(agent, iterations: int, stream: bool = False, history: list = None) -> list:
+    """Latency of `iterations` turns; the history is reset before each one."""
+    latencies = []
+    on_token = (lambda text: None) if stream else None
+    for number in range(iterations):
+        if history is None:
+            agent.clear_messages()
+        else:
+            agent.messages = list(history)
+        started = time.perf_counter()
+        agent.chat([{"type": "text", "text": f"question {number}"}], on_token=on_token)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+# Each scenario takes (mock, iterations) and returns the turn latencies in ms plus extra fields
+
+def single_turn(mock, iterations):
+    mock.script(answer_words=50)
+    agent = build_agent(mock.url)
+    try:
+        return run_turns(agent, iterations), {}
+    finally:
+        release(agent)
+
+
+def single_turn_stream(mock, iterations):
+    mock.script(answer_words=200)
+    agent = build_agent(mock.url)
+    try:
+        return run_turns(agent, iterations, stream=True), {}
+    finally:
+        release(agent)
+
+
+def flaky_endpoint(mock, iterations):
+    mock.script(answer_words=50, error_rate=0.2, error_statuses=[429, 500, 503], seed=1)
+    agent = build_agent(mock.url)
+    try:
+        return run_turns(agent, iterations), {"errors_injected": mock.stats()["errors_injected"]}
+    finally:
+        release(agent)
+
+
+def tool_loop_20(mock, iterations):
+    mock.script(tool_rounds=20, tool_name="think", tool_arguments={"thoughts": "step {i}"})
+    agent = build_agent(mock.url)
+    try:
+        return run_turns(agent, max(iterations // 10, 1), stream=True), {"rounds_per_turn": 21}
+    finally:
+        release(agent)
+
+
+def large_history(mock, iterations):
+    mock.script(answer_words=50)
+    agent = build_agent(mock.url)
+    history = [agent.messages[0]]
+    for number in range(1000):
+        history.append({"role": "user", "content": [{"type": "text", "text": f"earlier question {number} " + "lorem ipsum " * 30}]})
+        history.append({"role": "assistant", "content": f"earlier answer {number} " + "dolor sit amet " * 30})
+    try:
+        return run_turns(agent, iterations, history=history), {"history_messages": len(history)}
+    finally:
+        release(agent)
+
+
+def parallel_tools(mock, iterations):
+    mock.script(tool_rounds=1, parallel_tools=8, tool_name="execute_terminal",
+                tool_arguments={"terminal_command": "sleep 0.1", "session": "bench{i}"})
+    agent = build_agent(mock.url)
+    agent.tool_dispatcher.max_workers = 8
+    try:
+        return run_turns(agent, max(iterations // 10, 1)), {"tools_per_turn": 8, "tool_seconds_each": 0.1}
+    finally:
+        release(agent)
+
+
+def batch_throughput(mock, iterations):
+    from batch import run_batch
+    mock.script(answer_words=50)
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "in.jsonl")
+        output_path = os.path.join(directory, "out.jsonl")
+        with open(input_path, "w") as file:
+            for number in range(iterations * 4):
+                file.write(json.dumps({"id": number, "prompt": f"question {number}"}) + "\n")
+        stats = run_batch(lambda system=None: build_agent(mock.url, system), input_path, output_path,
+                          concurrency=8, release_agent=release)
+    return None, {"records": stats["processed"], "failed": stats["failed"], "throughput_per_s": stats["throughput_per_s"],
+                  "p50_ms": stats["latency_p50_ms"], "p95_ms": stats["latency_p95_ms"]}
+
+
+SCENARIOS = {
+    "single_turn": single_turn,
+    "single_turn_stream": single_turn_stream,
+    "flaky_endpoint": flaky_endpoint,
+    "tool_loop_20": tool_loop_20,
+    "large_history": large_history,
+    "parallel_tools": parallel_tools,
+    "batch_throughput": batch_throughput,
+}
+
+
+def run_scenario(mock, name: str, iterations: int, latency_ms: float) -> dict:
+    mock.defaults = {"latency_ms": latency_ms}
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    # Agents print their tool calls; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        latencies, extra = SCENARIOS[name](mock, iterations)
+    elapsed = time.perf_counter() - started
+    result = {"elapsed_s": round(elapsed, 3), "rss_mb": round(rss_mb(), 1),
+              "rss_growth_mb": round(rss_mb() - rss_before, 1)}
+    if latencies is not None:
+        result.update({
+            "turns": len(latencies),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "throughput_per_s": round(len(latencies) / elapsed, 2),
+        })
+    result.update(extra)
+    return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(results: dict, baseline: dict):
+    print(f"\ncompared with {baseline.get('revision') or 'baseline'}:")
+    for name, result in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "throughput_per_s", "rss_mb"):
+            if before.get(key) and key in result:
+                change = (result[key] - before[key]) / before[key] * 100
+                changes.append(f"{key} {before[key]} -> {result[key]} ({change:+.1f}%)")
+        print(f"  {name}: " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--iterations", type=int, default=30, help="turns per scenario (fewer for the slow ones)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="simulated server latency per request")
+    parser.add_argument("--out", default="bench-results.json")
+    parser.add_argument("--compare", metavar="BASELINE.json", help="earlier results to compare against")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    results = {"revision": git_revision(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+               "iterations": args.iterations, "latency_ms": args.latency_ms, "scenarios": {}}
+    mock = Mock()
+    try:
+        for name in names:
+            result = run_scenario(mock, name, args.iterations, args.latency_ms)
+            results["scenarios"][name] = result
+            print(f"{name}: " + ", ".join(f"{key}={value}" for key, value in result.items()), flush=True)
+    finally:
+        mock.close()
+    results["rss_peak_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1000, 1)
+
+    with open(args.out, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"results written to {args.out}")
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
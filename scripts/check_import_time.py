@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Import-time budget check for the llm CLI.
+
+Runs each scenario under `python3 -X importtime`, sums the cumulative time of the
+top-level imports made after interpreter startup (everything after `site`), keeps the
+best of a few runs and exits 1 if any scenario is over its budget.
+
+    python3 scripts/check_import_time.py [--help-budget-ms 25] [--agent-budget-ms 50]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = os.path.join(ROOT, "llm-cli_0.1.0")
+LLM = os.path.join(PACKAGE, "usr", "bin", "llm")
+LIBRARY = os.path.join(PACKAGE, "usr", "share", "llm-cli")
+
+SCENARIOS = {
+    # What `llm --help` imports
+    "help": [LLM, "--help"],
+    # Everything needed to build the agent for a question, without sending it
+    "agent": ["-c", f"import runpy; runpy.run_path({LLM!r}, run_name='llm')['get_agent']()"],
+}
+
+
+def measure(arguments: list):
+    """Returns (total microseconds, [(cumulative, module), ...]) for one run."""
+    env = dict(os.environ, LLM_CLI_HOME=LIBRARY)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # measure imports, not compilation
+    result = subprocess.run([sys.executable, "-X", "importtime"] + arguments, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imports = []
+    after_site = False
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.startswith("  "):
+            continue  # nested import, already counted by its parent
+        name = name.strip()
+        if name == "site":
+            after_site = True
+            continue
+        if after_site:
+            imports.append((int(cumulative), name))
+    return sum(cumulative for cumulative, _ in imports), imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--help-budget-ms", type=float, default=25)
+    parser.add_argument("--agent-budget-ms", type=float, default=50)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    budgets = {"help": args.help_budget_ms, "agent": args.agent_budget_ms}
+
+    failed = False
+    for name, arguments in SCENARIOS.items():
+        measure(arguments)  # warm-up run writes the .pyc files
+        total, imports = min((measure(arguments) for _ in range(args.runs)), key=lambda run: run[0])
+        status = "ok" if total / 1000 <= budgets[name] else "OVER BUDGET"
+        print(f"{name}: {total / 1000:.1f} ms (budget {budgets[name]:.0f} ms) {status}")
+        if status != "ok":
+            failed = True
+            for cumulative, module in sorted(imports, reverse=True)[:10]:
+                print(f"    {cumulative / 1000:7.1f} ms  {module}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
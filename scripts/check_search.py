@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Behaviour check for the search_code and find_files tools.
+
+Builds a small tree in a temporary directory, runs the tools on it the way the model
+would and exits 1 if any answer differs from what grep / a gitignore-style glob gives:
+anchored regexes (^ and $ match at every line), inline flags, ** in globs.
+
+    python3 scripts/check_search.py
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIBRARY = os.path.join(ROOT, "llm-cli_0.1.0", "usr", "share", "llm-cli")
+
+FILES = {
+    "src/a.ts": "export const a = 1;\n",
+    "src/lib/b.ts": "export const b = 2;\n",
+    "src/lib/c.py": "import os\n\ndef foo():\n    pass\n\nclass Foo:\n    pass\n",
+    "README.md": "BodyEncoder docs\n",
+}
+
+# (tool, arguments, text that must be in the answer, text that must not be)
+CASES = [
+    ("search_code", {"query": "^def foo", "regex": True}, "3: def foo():", None),
+    ("search_code", {"query": "pass$", "regex": True}, "4: pass", None),
+    ("search_code", {"query": "pass$", "regex": True}, "7: pass", None),
+    ("search_code", {"query": "^import", "regex": True, "glob": "*.py"}, "1: import os", None),
+    ("search_code", {"query": "(?i)BODYENCODER", "regex": True, "case_sensitive": True}, "README.md", None),
+    ("search_code", {"query": "export", "glob": "src/**/*.ts"}, "a.ts", None),
+    ("search_code", {"query": "export", "glob": "src/**/*.ts"}, "b.ts", None),
+    ("search_code", {"query": "export", "glob": "src/*.ts"}, "a.ts", "b.ts"),
+    ("find_files", {"pattern": "src/**/*.ts"}, "src/a.ts", None),
+    ("find_files", {"pattern": "src/**/*.ts"}, "src/lib/b.ts", "c.py"),
+]
+
+
+def main():
+    sys.path.insert(0, LIBRARY)
+    from functions_handler import Functions
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        for relative, text in FILES.items():
+            path = os.path.join(directory, relative)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(text)
+        functions = Functions(search_settings={"directory": None})
+        try:
+            for tool, arguments, expected, unexpected in CASES:
+                answer = getattr(functions, tool)(directory=directory, **arguments)
+                ok = expected in answer and (unexpected is None or unexpected not in answer)
+                print(f"{'ok  ' if ok else 'FAIL'} {tool} {arguments}")
+                if not ok:
+                    failed = True
+                    print("    " + answer.replace("\n", "\n    "))
+        finally:
+            functions.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI-compatible chat completions endpoint, for benchmarks and
+offline testing. Every POST gets a scripted response; nothing is billed.
+
+    python3 scripts/mock_openai.py [--port 8080] [--latency-ms 50] [--tool-rounds 2]
+
+Script (all options can be changed at runtime by POSTing JSON to /_script):
+  latency_ms        delay before the response starts
+  chunk_delay_ms    delay between stream chunks
+  answer_words      words in the final answer (one stream chunk each)
+  tool_rounds       assistant tool_calls rounds per user turn before the final answer
+  parallel_tools    tool calls per round
+  tool_name, tool_arguments
+                    the call to make; "{i}" in string arguments becomes the call number
+  error_rate        fraction of requests answered with an error status
+  error_statuses    statuses to pick from, e.g. [429, 503]
+  seed              random seed, so error injection is repeatable
+
+GET /_stats returns the request count, errors injected and bytes received.
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_SCRIPT = {
+    "latency_ms": 0,
+    "chunk_delay_ms": 0,
+    "answer_words": 20,
+    "tool_rounds": 0,
+    "parallel_tools": 1,
+    "tool_name": "think",
+    "tool_arguments": {"thoughts": "step {i}"},
+    "error_rate": 0.0,
+    "error_statuses": [429, 503],
+    "seed": 0,
+}
+
+
+class MockState:
+    def __init__(self, script: dict = None):
+        self.lock = threading.Lock()
+        self.configure(script or {})
+
+    def configure(self, script: dict):
+        with self.lock:
+            self.script = dict(DEFAULT_SCRIPT, **script)
+            self.random = random.Random(self.script["seed"])
+            self.stats = {"requests": 0, "errors_injected": 0, "bytes_received": 0}
+
+    def next_error(self, size: int):
+        """Counts the request and returns the status to fail it with, or None."""
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_received"] += size
+            if self.random.random() < self.script["error_rate"]:
+                self.stats["errors_injected"] += 1
+                return self.random.choice(self.script["error_statuses"])
+        return None
+
+
+def _arguments(template: dict, number: int) -> str:
+    filled = {key: value.replace("{i}", str(number)) if isinstance(value, str) else value
+              for key, value in template.items()}
+    return json.dumps(filled)
+
+
+def build_message(script: dict, messages: list) -> dict:
+    """Tool calls until this user turn has had `tool_rounds` rounds of them, then the answer."""
+    rounds = 0
+    for message in reversed(messages):
+        if message.get('role') == 'user':
+            break
+        if message.get('role') == 'assistant' and message.get('tool_calls'):
+            rounds += 1
+    if rounds < script["tool_rounds"]:
+        calls = [{"id": f"call_{rounds}_{number}", "type": "function",
+                  "function": {"name": script["tool_name"], "arguments": _arguments(script["tool_arguments"], number)}}
+                 for number in range(script["parallel_tools"])]
+        return {"role": "assistant", "content": None, "tool_calls": calls}
+    words = " ".join(f"word{number}" for number in range(script["answer_words"]))
+    return {"role": "assistant", "content": words}
+
+
+def build_usage(body_size: int, message: dict) -> dict:
+    completion = len(json.dumps(message)) // 4
+    prompt = body_size // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+
+    def setup(self):
+        super().setup()
+        # Headers and body are separate writes; without this Nagle + delayed ACK add ~40ms per response
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json", headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/_stats":
+            self._send(200, json.dumps(self.server.state.stats).encode())
+        else:
+            self._send(404, b"{}")
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        state = self.server.state
+        if self.path == "/_script":
+            state.configure(json.loads(raw or b"{}"))
+            self._send(200, b"{}")
+            return
+
+        script = state.script
+        if script["latency_ms"]:
+            time.sleep(script["latency_ms"] / 1000)
+        status = state.next_error(len(raw))
+        if status is not None:
+            headers = {"Retry-After": "0"} if status == 429 else {}
+            self._send(status, json.dumps({"error": {"message": f"injected {status}"}}).encode(), headers=headers)
+            return
+
+        body = json.loads(raw)
+        message = build_message(script, body.get("messages") or [])
+        usage = build_usage(len(raw), message)
+        if body.get("stream"):
+            self._stream(script, message, usage)
+        else:
+            response = {"id": "mock", "object": "chat.completion", "model": body.get("model"),
+                        "choices": [{"index": 0, "message": message,
+                                     "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+                        "usage": usage}
+            self._send(200, json.dumps(response).encode())
+
+    def _stream(self, script: dict, message: dict, usage: dict):
+        # Chunked transfer, so chunk_delay_ms actually spaces out what the client receives
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(data: dict):
+            payload = b"data: " + json.dumps(data).encode() + b"\n\n"
+            self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+            self.wfile.flush()
+
+        if message.get("tool_calls"):
+            deltas = [{"role": "assistant", "tool_calls": [dict(call, index=index) for index, call in enumerate(message["tool_calls"])]}]
+            finish = "tool_calls"
+        else:
+            words = message["content"].split(" ")
+            deltas = [{"role": "assistant", "content": ""}] + [{"content": word if i == 0 else " " + word} for i, word in enumerate(words)]
+            finish = "stop"
+        for delta in deltas:
+            event({"id": "mock", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            if script["chunk_delay_ms"]:
+                time.sleep(script["chunk_delay_ms"] / 1000)
+        event({"id": "mock", "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]})
+        event({"id": "mock", "choices": [], "usage": usage})
+        payload = b"data: [DONE]\n\n"
+        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n0\r\n\r\n")
+        self.wfile.flush()
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), script: dict = None):
+        super().__init__(address, Handler)
+        self.state = MockState(script)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1/chat/completions"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="0 picks a free port")
+    for name, value in DEFAULT_SCRIPT.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+    script = {name: getattr(args, name) for name in DEFAULT_SCRIPT if hasattr(args, name)}
+
+    server = MockServer((args.host, args.port), script)
+    print(server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()